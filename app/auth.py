@@ -1,4 +1,4 @@
-import os, hmac
+import os, hashlib
 from typing import Optional, List
 from fastapi import Header, HTTPException, status
 
@@ -8,20 +8,38 @@ def _load_keys() -> List[str]:
 
 API_KEYS = _load_keys()
 
+def key_digest(key: str) -> bytes:
+    return hashlib.sha256(key.encode("utf-8")).digest()
+
+# keys are matched by digest: one set probe however many keys there are, and the
+# probe compares fixed-length hashes rather than the secrets themselves
+_DIGESTS = frozenset(key_digest(k) for k in API_KEYS)
+
 def _valid(provided: str) -> bool:
-    for k in API_KEYS:
-        if hmac.compare_digest(provided, k):
-            return True
-    return False
+    return key_digest(provided) in _DIGESTS
+
+def extract_token(authorization: Optional[str], x_api_key: Optional[str]) -> Optional[str]:
+    if x_api_key:
+        return x_api_key
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    return None
+
+def client_key(authorization: Optional[str], x_api_key: Optional[str]) -> Optional[str]:
+    """A stable, non-secret id for the caller's key (for rate limiting), or None when there is no usable key."""
+    token = extract_token(authorization, x_api_key)
+    if not token:
+        return None
+    digest = key_digest(token)
+    if _DIGESTS and digest not in _DIGESTS:
+        # invalid keys share the caller's address bucket, so random keys can't mint fresh allowances
+        return None
+    return digest.hex()[:16]
 
 async def require_api_key(authorization: Optional[str] = Header(None), x_api_key: Optional[str] = Header(None)):
     if not API_KEYS:
         return
-    token = None
-    if x_api_key:
-        token = x_api_key
-    elif authorization and authorization.lower().startswith("bearer "):
-        token = authorization[7:].strip()
+    token = extract_token(authorization, x_api_key)
     if token and _valid(token):
         return
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
@@ -0,0 +1,274 @@
+"""Bulk corpus generator for load tests, independent of the API.
+
+    python -m app.bulkgen --objects 1000000 --out ./data --seed 42 --shard-size 100000
+
+Objects have the same shapes as generator.generate_payload, but are produced in
+batches from one seedable RNG and streamed straight into sharded snapshot files.
+"""
+import argparse, os, random, sys, time
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Iterator, Optional
+from .generator import (
+    utcnow, iso_z, source_ti, MALWARE_FAMILIES, THREAT_ACTORS, KILL_CHAIN_PHASES, ATTACK_PATTERNS,
+    DOMAIN_PREFIXES, DOMAIN_MIDDLES, DOMAIN_TLDS, URL_PATHS, URL_PARAMS, TOKEN_ALPHABET,
+)
+from .serialize import dumps
+from .segments import SEGMENT_EXT, index_entry, write_index
+
+SOURCE_SYSTEM = "STEELCAGE.AI X-GEN TI PLATFORM"
+
+_INDICATOR_KINDS = ("ipv4", "domain", "url", "file-hash")
+_KCP = {
+    "ipv4": [KILL_CHAIN_PHASES[5]],
+    "domain": [KILL_CHAIN_PHASES[5], KILL_CHAIN_PHASES[4]],
+    "url": [KILL_CHAIN_PHASES[2], KILL_CHAIN_PHASES[3]],
+    "file-hash": [KILL_CHAIN_PHASES[1], KILL_CHAIN_PHASES[2], KILL_CHAIN_PHASES[4]],
+}
+
+class BulkGenerator:
+    def __init__(self, seed: Optional[int] = None, cluster_size: int = 1000, now: Optional[datetime] = None):
+        self.rng = random.Random(seed)
+        self.cluster_size = max(cluster_size, 1)
+        # pin the clock as well as the seed to get a byte-identical corpus
+        self.now = now
+
+    def _ids(self, sdo: str, n: int) -> List[str]:
+        getrandbits = self.rng.getrandbits
+        out = []
+        for _ in range(n):
+            # RFC 4122 version 4 / variant 1 bits, same shape as uuid.uuid4()
+            h = f"{(getrandbits(128) & ~(0xF << 76) & ~(0x3 << 62)) | (4 << 76) | (0x2 << 62):032x}"
+            out.append(f"{sdo}--{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}")
+        return out
+
+    def _ipv4s(self, n: int) -> List[str]:
+        out = []
+        for _ in range(n):
+            b = self.rng.getrandbits(32)
+            out.append(f"{(b >> 24) % 254 + 1}.{(b >> 16) & 0xFF}.{(b >> 8) & 0xFF}.{(b & 0xFF) % 253 + 1}")
+        return out
+
+    def _domains(self, n: int) -> List[str]:
+        rng = self.rng
+        return [f"{p}-{m}{rng.randint(100, 999)}{t}" for p, m, t in zip(
+            rng.choices(DOMAIN_PREFIXES, k=n), rng.choices(DOMAIN_MIDDLES, k=n), rng.choices(DOMAIN_TLDS, k=n))]
+
+    def _urls(self, n: int) -> List[str]:
+        rng = self.rng
+        out = []
+        for dom, path, param in zip(self._domains(n), rng.choices(URL_PATHS, k=n), rng.choices(URL_PARAMS, k=n)):
+            if param:
+                param = param + "".join(rng.choices(TOKEN_ALPHABET, k=8))
+            out.append(f"https://{dom}{path}{param}")
+        return out
+
+    def _md5s(self, n: int) -> List[str]:
+        getrandbits = self.rng.getrandbits
+        return [f"{getrandbits(128):032x}" for _ in range(n)]
+
+    def cluster(self) -> List[Dict[str, Any]]:
+        """One generate_payload-shaped batch: identities, indicators, attack patterns, relationships."""
+        rng = self.rng
+        n = self.cluster_size
+        now = self.now or utcnow()
+        created = iso_z(now)
+        valid_from = iso_z(now - timedelta(days=rng.randint(0, 10), hours=rng.randint(0, 23)))
+        source = source_ti()
+        objects: List[Dict[str, Any]] = []
+
+        identity_ids = self._ids("identity", 3)
+        for oid, actor in zip(identity_ids, THREAT_ACTORS[:3]):
+            objects.append({
+                "type": "identity", "spec_version": "2.1", "id": oid, "created": created, "modified": created,
+                "name": actor, "source": source,
+                "description": f"Threat actor group {actor} - Known for sophisticated cyber operations",
+                "identity_class": "group", "pattern": f"[identity:name = '{actor}']", "pattern_type": "stix",
+                "valid_from": valid_from,
+            })
+
+        kinds = rng.choices(_INDICATOR_KINDS, k=n)
+        counts = {k: kinds.count(k) for k in _INDICATOR_KINDS}
+        values = {
+            "ipv4": iter(self._ipv4s(counts["ipv4"])),
+            "domain": iter(self._domains(counts["domain"])),
+            "url": iter(self._urls(counts["url"])),
+            "file-hash": iter(self._md5s(counts["file-hash"])),
+        }
+        indicator_ids = self._ids("indicator", n)
+        malwares = rng.choices(MALWARE_FAMILIES, k=n)
+        actors = rng.choices(THREAT_ACTORS, k=n)
+        for oid, kind, malware, actor in zip(indicator_ids, kinds, malwares, actors):
+            value = next(values[kind])
+            if kind == "ipv4":
+                pattern = f"[ipv4-addr:value = '{value}']"
+                name = f"Malicious IP - {malware} C2"
+                description = f"IP address associated with {malware} activity attributed to threat actor: {actor}."
+            elif kind == "domain":
+                pattern = f"[domain-name:value = '{value}']"
+                name = f"Malicious Domain - {malware}"
+                description = f"Domain used by {malware} infrastructure attributed to threat actor: {actor}."
+            elif kind == "url":
+                pattern = f"[url:value = '{value}']"
+                name = f"Malicious URL - {malware}"
+                description = f"URL serving {malware} payload attributed to {actor} campaign."
+            else:
+                pattern = f"[file:hashes.MD5 = '{value}']"
+                name = f"Malicious File Hash - {malware}"
+                description = f"MD5 hash of {malware} variant associated with {actor} operations."
+            objects.append({
+                "type": "indicator", "spec_version": "2.1", "id": oid, "source": source,
+                "created": created, "modified": created, "valid_from": valid_from, "pattern_type": "stix",
+                "labels": ["malicious-activity"], "confidence": rng.randint(60, 100),
+                "pattern": pattern, "name": name, "description": description, "kill_chain_phases": _KCP[kind],
+            })
+
+        attack_pattern_ids = self._ids("attack-pattern", len(ATTACK_PATTERNS))
+        for oid, ap in zip(attack_pattern_ids, ATTACK_PATTERNS):
+            objects.append({
+                "type": "attack-pattern", "spec_version": "2.1", "id": oid, "created": created, "modified": created,
+                "name": ap["name"], "source": source, "description": ap["description"],
+                "pattern": f"[attack-pattern:name = '{ap['name']}']", "pattern_type": "stix",
+                "valid_from": valid_from, "kill_chain_phases": ap["phases"],
+                "external_references": [{
+                    "source_name": "mitre-attack",
+                    "external_id": ap["external_id"],
+                    "url": f"https://attack.mitre.org/techniques/{ap['external_id']}/",
+                }],
+            })
+
+        # same mix as generate_payload, scaled to the cluster: ~1/3 indicate/use an attack pattern, ~1/5 attributed
+        n_uses, n_attr = max(n // 3, min(5, n)), max(n // 5, min(3, n))
+        rel_ids = self._ids("relationship", n_uses + n_attr)
+        sources = rng.choices(indicator_ids, k=n_uses + n_attr)
+        targets = rng.choices(attack_pattern_ids, k=n_uses) + rng.choices(identity_ids, k=n_attr)
+        rel_types = rng.choices(("indicates", "uses"), k=n_uses) + ["attributed-to"] * n_attr
+        for i, (oid, src, dst, rel_type) in enumerate(zip(rel_ids, sources, targets, rel_types)):
+            objects.append({
+                "type": "relationship", "spec_version": "2.1", "id": oid, "created": created, "modified": created,
+                "name": f"Relationship: {rel_type}", "source": source,
+                "description": "Indicator relationship to attack pattern" if i < n_uses else "Indicator attributed to threat actor group",
+                "pattern": f"[relationship:type = '{rel_type}']", "pattern_type": "stix", "valid_from": valid_from,
+                "relationship_type": rel_type, "source_ref": src, "target_ref": dst,
+            })
+        return objects
+
+    def objects(self, total: int) -> Iterator[Dict[str, Any]]:
+        produced = 0
+        while produced < total:
+            for obj in self.cluster():
+                if produced >= total:
+                    return
+                yield obj
+                produced += 1
+
+class ShardWriter:
+    """Writes objects into shard files of at most `shard_size` objects, each renamed into place when complete."""
+
+    def __init__(self, out_dir: str, fmt: str = "json", shard_size: int = 100_000, source_system: str = SOURCE_SYSTEM):
+        if fmt not in ("json", "ndjson"):
+            raise ValueError(f"unsupported format: {fmt}")
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.shard_size = max(shard_size, 1)
+        self.source_system = source_system
+        self.stamp = iso_z(utcnow()).replace(":", "").replace("-", "")
+        self.paths: List[str] = []
+        self.bytes_written = 0
+        self._fh = None
+        self._tmp = ""
+        self._final = ""
+        self._count = 0
+        self._entries: List[Any] = []
+
+    def _open(self) -> None:
+        ext = SEGMENT_EXT if self.fmt == "ndjson" else ".json"
+        name = f"indicators_{self.stamp}-{len(self.paths):05d}{ext}"
+        self._final = os.path.join(self.out_dir, name)
+        self._tmp = os.path.join(self.out_dir, f".{name}.tmp")
+        self._fh = open(self._tmp, "wb", buffering=1 << 20)
+        self._count = 0
+        self._entries = []
+        if self.fmt == "json":
+            self._fh.write(b'{"sourcesystem":' + dumps(self.source_system) + b',"stixobjects":[')
+
+    def _close(self) -> None:
+        if self._fh is None:
+            return
+        if self.fmt == "json":
+            self._fh.write(b"]}")
+        size = self._fh.tell()
+        self.bytes_written += size
+        self._fh.close()
+        self._fh = None
+        if self.fmt == "ndjson":
+            # sidecar index first, so the segment never appears without one
+            write_index(self._final, size, self._entries)
+        os.replace(self._tmp, self._final)
+        self.paths.append(self._final)
+
+    def write(self, obj: Dict[str, Any]) -> None:
+        if self._fh is None:
+            self._open()
+        raw = dumps(obj)
+        if self.fmt == "ndjson":
+            self._entries.append(index_entry(obj, self._fh.tell(), len(raw)))
+            self._fh.write(raw + b"\n")
+        else:
+            self._fh.write(raw if self._count == 0 else b"," + raw)
+        self._count += 1
+        if self._count >= self.shard_size:
+            self._close()
+
+    def close(self) -> None:
+        self._close()
+
+def run(total: int, out_dir: str, seed: Optional[int] = None, fmt: str = "json", shard_size: int = 100_000,
+        rate: float = 0.0, cluster_size: int = 1000, now: Optional[datetime] = None, progress: bool = True) -> Dict[str, Any]:
+    gen = BulkGenerator(seed=seed, cluster_size=cluster_size, now=now)
+    writer = ShardWriter(out_dir, fmt=fmt, shard_size=shard_size)
+    started = time.perf_counter()
+    written = 0
+    try:
+        for obj in gen.objects(total):
+            writer.write(obj)
+            written += 1
+            if rate > 0 and written % 1000 == 0:
+                ahead = written / rate - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+            if progress and written % shard_size == 0:
+                elapsed = time.perf_counter() - started
+                print(f"[bulkgen] {written}/{total} objects, {written / elapsed:,.0f} obj/s", file=sys.stderr)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    return {
+        "objects": written,
+        "files": writer.paths,
+        "bytes": writer.bytes_written,
+        "seconds": round(elapsed, 3),
+        "objects_per_second": round(written / elapsed, 1) if elapsed > 0 else None,
+    }
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Generate a large synthetic STIX 2.1 corpus as sharded snapshot files.")
+    ap.add_argument("--objects", type=int, required=True, help="total number of objects to write")
+    ap.add_argument("--out", default=os.getenv("DATA_DIR", "./data"), help="output directory (default: $DATA_DIR or ./data)")
+    ap.add_argument("--seed", type=int, default=None, help="RNG seed for a reproducible corpus")
+    ap.add_argument("--format", choices=("json", "ndjson"), default="json")
+    ap.add_argument("--shard-size", type=int, default=100_000, help="objects per output file")
+    ap.add_argument("--rate", type=float, default=0.0, help="target objects/second (0 = as fast as possible)")
+    ap.add_argument("--cluster-size", type=int, default=1000, help="indicators per generated batch")
+    ap.add_argument("--now", default=None, help="fixed RFC3339 'current time' for created/valid_from, e.g. 2025-08-12T00:00:00Z")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args(argv)
+    now = datetime.fromisoformat(args.now.replace("Z", "+00:00")).astimezone(timezone.utc) if args.now else None
+    report = run(args.objects, args.out, seed=args.seed, fmt=args.format, shard_size=args.shard_size,
+                 rate=args.rate, cluster_size=args.cluster_size, now=now, progress=not args.quiet)
+    rate = report["objects_per_second"]
+    print(f"[bulkgen] wrote {report['objects']} objects in {len(report['files'])} file(s), "
+          f"{report['bytes']} bytes, {report['seconds']}s, {f'{rate:,.0f}' if rate is not None else 'n/a'} obj/s")
+
+if __name__ == "__main__":
+    main()
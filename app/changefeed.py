@@ -0,0 +1,66 @@
+"""Wake-ups and wire format for the change feed (/api/v1/changes).
+
+Store builds happen in worker threads (generator, compaction, watcher); the
+notifier hops each one onto the event loop, where any number of held requests
+wait on a single asyncio.Event, so idle consumers cost no polling at all.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .serialize import dumps
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+class ChangeNotifier:
+    """notify() may be called from any thread; wait() from coroutines on the attached loop."""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def notify(self, generation: int = 0) -> None:
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # loop already closed (shutdown)
+            pass
+
+    def _wake(self) -> None:
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """True if a build landed within `timeout` seconds."""
+        if self._event is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+def delta(changes: Iterable[Tuple[int, Tuple[str, ...], Tuple[str, ...]]], types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Store changes as JSON-ready entries; `types` filters on the STIX id prefix, which removed ids still carry."""
+    wanted = set(types) if types else None
+    out = []
+    for generation, added, removed in changes:
+        if wanted is not None:
+            added = [oid for oid in added if oid.split("--", 1)[0] in wanted]
+            removed = [oid for oid in removed if oid.split("--", 1)[0] in wanted]
+        out.append({"generation": generation, "added": list(added), "removed": list(removed)})
+    return out
+
+def sse_message(data: Dict[str, Any], event: Optional[str] = None, id: Optional[int] = None) -> bytes:
+    head = b""
+    if id is not None:
+        head += b"id: %d\n" % id
+    if event:
+        head += b"event: " + event.encode("utf-8") + b"\n"
+    return head + b"data: " + dumps(data) + b"\n\n"
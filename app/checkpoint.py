@@ -0,0 +1,90 @@
+"""Binary checkpoint of the store's per-file index, for warm starts.
+
+Layout: MAGIC, then the object bodies of every JSON snapshot back to back, then
+a compact JSON header, then the header's offset as 8 big-endian bytes. The
+header lists, per data file, its (mtime_ns, size) when checkpointed and its
+entries column-wise, with the IOC, relationship and name rows already
+extracted. Bodies from JSON snapshots point into the checkpoint itself; bodies
+from segments point into the segment, which is never copied. A reader
+memory-maps the file, so restoring parses one header and touches no body.
+"""
+import os, struct
+from typing import Iterator, List, Tuple
+from .segments import SEGMENT_EXT, Segment
+from .serialize import dumps, loads
+from .interning import intern, materialize
+
+MAGIC = b"STIXCKP1"
+CHECKPOINT_VERSION = 2
+_TRAILER = struct.Struct(">Q")
+
+# (path, (mtime_ns, size), entries, (iocs, rels, names)) -- entries as held by ObjectStore
+FileRecord = Tuple[str, Tuple[int, int], list, tuple]
+
+def write_checkpoint(path: str, data_dir: str, files: List[FileRecord]) -> int:
+    """Atomically write a checkpoint of `files`; returns its size in bytes."""
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    try:
+        with open(tmp, "wb", buffering=1 << 20) as fh:
+            fh.write(MAGIC)
+            off = len(MAGIC)
+            records = []
+            for p, (mtime, size), entries, links in files:
+                segment = p.endswith(SEGMENT_EXT)
+                offs: List[int] = []
+                lens: List[int] = []
+                for _, _, _, _, raw, _ in entries:
+                    if segment:
+                        offs.append(raw[1])
+                        lens.append(raw[2])
+                        continue
+                    body = materialize(raw)
+                    fh.write(body)
+                    offs.append(off)
+                    lens.append(len(body))
+                    off += len(body)
+                records.append([os.path.relpath(p, data_dir), mtime, size, segment,
+                                [e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries],
+                                [e[3] for e in entries], offs, lens, [e[5] for e in entries],
+                                list(links[0]), list(links[1]), list(links[2])])
+            fh.write(dumps({"v": CHECKPOINT_VERSION, "files": records}))
+            fh.write(_TRAILER.pack(off))
+            size = fh.tell()
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return size
+
+def read_checkpoint(path: str, data_dir: str) -> Iterator[FileRecord]:
+    """Records from a checkpoint, or nothing when it is missing, foreign or damaged.
+
+    Validating each file's (mtime, size) against the disk is left to the caller.
+    """
+    try:
+        blob = Segment(path)
+        if blob.size < len(MAGIC) + _TRAILER.size or blob.read(0, len(MAGIC)) != MAGIC:
+            return
+        (start,) = _TRAILER.unpack(blob.read(blob.size - _TRAILER.size, _TRAILER.size))
+        header = loads(blob.read(start, blob.size - _TRAILER.size - start))
+    except (OSError, ValueError, struct.error):
+        return
+    if header.get("v") != CHECKPOINT_VERSION:
+        return
+    for rel, mtime, size, segment, ids, types, ts, vers, offs, lens, gens, iocs, rels, names in header["files"]:
+        p = os.path.join(data_dir, rel)
+        if segment:
+            try:
+                source = Segment(p)
+            except OSError:
+                continue
+        else:
+            source = blob
+        entries = [(oid, intern(otype), t, ver, (source, off, ln), gen)
+                   for oid, otype, t, ver, off, ln, gen in zip(ids, types, ts, vers, offs, lens, gens)]
+        yield p, (mtime, size), entries, ([tuple(r) for r in iocs], [tuple(r) for r in rels], [tuple(r) for r in names])
@@ -0,0 +1,120 @@
+"""Retention and compaction of DATA_DIR.
+
+Older snapshot files are merged into a single deduped segment (first file wins, as
+in the store), objects past the retention limits are dropped, and the inputs are
+removed only after the new segment is fully in place.
+"""
+import os, time
+from typing import Dict, Any, Optional
+from .file_store import ts_key
+from .generator import iso_z, utcnow
+from .segments import INDEX_EXT, SEGMENT_EXT, index_path, write_rows
+from .store import ObjectStore, _is_data_file, _read_file
+from .interning import materialize
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _compact_name(last_input: str) -> str:
+    # "<prefix>-0-compact-<stamp>" sorts before every file sharing the newest input's
+    # timestamp prefix and after all older ones, so first-file-wins precedence is kept.
+    stem = os.path.basename(last_input).rsplit(".", 1)[0]
+    prefix = stem.split("-", 1)[0]
+    stamp = iso_z(utcnow()).replace(":", "").replace("-", "")
+    return f"{prefix}-0-compact-{stamp}"
+
+def compact(data_dir: str, max_age_days: float = 0, max_objects: int = 0, keep_recent: int = 1, min_files: int = 2,
+            store: Optional[ObjectStore] = None) -> Dict[str, Any]:
+    """Merge all but the newest `keep_recent` top-level data files into one segment.
+
+    `max_age_days` drops objects whose valid_from/created is older than that;
+    `max_objects` caps the whole directory at the newest N objects. 0 disables either.
+    Returns a report of files merged and bytes/objects reclaimed.
+    """
+    names = sorted(n for n in os.listdir(data_dir) if _is_data_file(n) and os.path.isfile(os.path.join(data_dir, n)))
+    paths = [os.path.join(data_dir, n) for n in names]
+    recent = paths[len(paths) - keep_recent:] if keep_recent > 0 else []
+    inputs = paths[: len(paths) - len(recent)]
+    report: Dict[str, Any] = {"files_merged": 0, "objects_in": 0, "objects_out": 0, "duplicates": 0, "expired": 0,
+                              "bytes_before": 0, "bytes_after": 0, "bytes_reclaimed": 0, "objects_reclaimed": 0, "segment": None}
+    if not inputs or (len(inputs) < min_files and not (max_age_days or max_objects)):
+        return report
+
+    started = time.perf_counter()
+    seen = set()
+    rows = []
+    for p in inputs:
+        try:
+            entries = _read_file(p)
+        except Exception:
+            # unreadable: leave it alone rather than lose it
+            inputs = [q for q in inputs if q != p]
+            continue
+        for entry in entries:
+            report["objects_in"] += 1
+            if entry[0] in seen:
+                report["duplicates"] += 1
+                continue
+            seen.add(entry[0])
+            # keep the generation each object was first served in: cursors pinned before this
+            # compaction must still see it, though the segment it moves to is newer
+            rows.append(entry[:5] + (store.file_generation(p, entry) if store is not None else 0,))
+    if not inputs:
+        return report
+
+    if max_age_days:
+        cutoff = ts_key(utcnow().replace(tzinfo=None)) - int(max_age_days * 86400 * 1_000_000)
+        kept = [r for r in rows if r[2] >= cutoff]
+        report["expired"] += len(rows) - len(kept)
+        rows = kept
+    if max_objects:
+        recent_count = 0
+        for p in recent:
+            try:
+                recent_count += len([e for e in _read_file(p) if e[0] not in seen])
+            except Exception:
+                continue
+        budget = max(max_objects - recent_count, 0)
+        if len(rows) > budget:
+            rows.sort(key=lambda r: (-r[2], r[0]))
+            report["expired"] += len(rows) - budget
+            rows = rows[:budget]
+
+    if len(inputs) < min_files and not report["expired"]:
+        # nothing to merge and nothing to drop: don't churn the directory
+        return report
+
+    rows.sort(key=lambda r: (-r[2], r[0]))
+    report["bytes_before"] = sum(_size(p) + (_size(index_path(p)) if p.endswith(SEGMENT_EXT) else 0) for p in inputs)
+    seg_path = write_rows(data_dir, _compact_name(inputs[-1]),
+                          ((oid, otype, ts, ver, materialize(raw), gen)
+                           for oid, otype, ts, ver, raw, gen in rows))
+
+    # the new segment is complete on disk; only now do the inputs go away
+    for p in inputs:
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+        if p.endswith(SEGMENT_EXT):
+            try:
+                os.remove(p[: -len(SEGMENT_EXT)] + INDEX_EXT)
+            except OSError:
+                pass
+    if store is not None:
+        store.ingest(seg_path, *inputs)
+
+    report.update({
+        "files_merged": len(inputs),
+        "objects_out": len(rows),
+        "bytes_after": _size(seg_path) + _size(index_path(seg_path)),
+        "segment": seg_path,
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+    # a segment plus its index can outgrow small JSON inputs; that is nothing reclaimed, not a negative amount
+    report["bytes_reclaimed"] = max(0, report["bytes_before"] - report["bytes_after"])
+    report["objects_reclaimed"] = report["objects_in"] - report["objects_out"]
+    return report
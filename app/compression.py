@@ -0,0 +1,94 @@
+import gzip, zlib
+from typing import Optional, Iterable, Iterator, List, Tuple, Dict
+from .lru import ByteLRU
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# server preference when the client weighs several encodings equally
+ENCODINGS: List[str] = [e for e, mod in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)) if mod is not None]
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best available encoding from an Accept-Encoding header, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        bits = [b.strip() for b in part.split(";")]
+        name = bits[0].lower()
+        if not name:
+            continue
+        q = 1.0
+        for b in bits[1:]:
+            if b.startswith("q="):
+                try:
+                    q = float(b[2:])
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    best, best_q = None, 0.0
+    for enc in ENCODINGS:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+def _compressor(encoding: str, level: int):
+    if encoding == "gzip":
+        c = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return c.compress, c.flush
+    if encoding == "zstd":
+        c = zstandard.ZstdCompressor(level=min(level, 19)).compressobj()
+        return c.compress, c.flush
+    if encoding == "br":
+        c = brotli.Compressor(quality=min(level, 11))
+        return c.process, c.finish
+    raise ValueError(f"unsupported encoding: {encoding}")
+
+def compress(data: bytes, encoding: str, level: int = 6) -> bytes:
+    feed, finish = _compressor(encoding, level)
+    return feed(data) + finish()
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str, level: int = 6) -> Iterator[bytes]:
+    feed, finish = _compressor(encoding, level)
+    for chunk in chunks:
+        out = feed(chunk)
+        if out:
+            yield out
+    tail = finish()
+    if tail:
+        yield tail
+
+class BodyCache(ByteLRU):
+    """Byte-bounded LRU of compressed response bodies.
+
+    Keys embed the ETag (store build + path + query) and the encoding, so a new
+    build never serves stale bytes; old entries just age out. Values are
+    (body, media type, headers): a replay has to answer exactly as the original
+    did, down to a stream's media type and X-Total-Count.
+    """
+
+    def keep(self, key: Tuple[str, str], body: bytes, media_type: str, headers: Dict[str, str]) -> None:
+        self.put(key, (body, media_type, headers), len(body))
+
+    def tee(self, key: Tuple[str, str], chunks: Iterable[bytes], media_type: str, headers: Dict[str, str]) -> Iterator[bytes]:
+        """Pass `chunks` through, caching the whole body if it completes and stays small enough."""
+        kept: Optional[List[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            if kept is not None:
+                size += len(chunk)
+                if size > self.max_entry:
+                    kept = None
+                else:
+                    kept.append(chunk)
+            yield chunk
+        if kept is not None:
+            self.keep(key, b"".join(kept), media_type, headers)
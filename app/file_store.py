@@ -1,60 +1,63 @@
-import json, os
-from datetime import datetime
-from typing import List, Dict, Any, Optional, Iterable
+from functools import lru_cache
+from datetime import date, datetime, timedelta
+from typing import Dict, Any
+
+_FORMATS = ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ")
 
 def _parse_dt(s: str) -> datetime:
-    for fmt in ("%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%SZ"):
+    for fmt in _FORMATS:
         try:
             return datetime.strptime(s, fmt)
         except ValueError:
             continue
     return datetime(1970,1,1)
 
-def _key(o: Dict[str, Any]):
-    ts = o.get("valid_from") or o.get("created") or "1970-01-01T00:00:00Z"
-    return _parse_dt(ts)
-
-def load_objects(data_dir: str, since: Optional[str] = None, limit: Optional[int] = None, types: Optional[Iterable[str]] = None) -> Dict[str, Any]:
-    objects: Dict[str, Dict[str, Any]] = {}
-    since_dt: Optional[datetime] = None
-    if since:
-        since_dt = _parse_dt(since)
-
-    for root, _, files in os.walk(data_dir):
-        for name in sorted(files):
-            if not name.lower().endswith(".json"):
-                continue
-            full = os.path.join(root, name)
+_EPOCH = datetime(1970, 1, 1)
+
+def ts_key(dt: datetime) -> int:
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# a snapshot's objects share a handful of timestamps, so most calls are cache hits
+@lru_cache(maxsize=8192)
+def parse_ts(s: str) -> int:
+    """An RFC 3339 UTC timestamp as integer microseconds since the epoch, without strptime.
+
+    Handles the "YYYY-MM-DDTHH:MM:SS[.ffffff]Z" shape the generator writes by slicing;
+    anything else goes through _parse_dt, with the same epoch fallback.
+    """
+    if len(s) >= 20 and s[-1] == "Z" and s[4] == "-" and s[7] == "-" and s[10] == "T" and s[13] == ":" and s[16] == ":":
+        frac = s[20:-1] if s[19] == "." else ("" if len(s) == 20 else None)
+        if frac is not None and len(frac) <= 6 and (not frac or frac.isdigit()):
             try:
-                with open(full, "r", encoding="utf-8") as fh:
-                    payload = json.load(fh)
-            except Exception:
-                continue
-
-            objs = payload.get("stixobjects", [])
-            for obj in objs:
-                if not isinstance(obj, dict):
-                    continue
-                if obj.get("spec_version") != "2.1":
-                    continue
-                if types and obj.get("type") not in types:
-                    continue
-                ts = obj.get("valid_from") or obj.get("created")
-                if since_dt and ts:
-                    try:
-                        obj_dt = _parse_dt(ts)
-                        if obj_dt < since_dt:
-                            continue
-                    except Exception:
-                        pass
-                oid = obj.get("id")
-                if oid and oid not in objects:
-                    objects[oid] = obj
-
-    merged = sorted(objects.values(), key=_key, reverse=True)
-    if isinstance(limit, int) and limit > 0:
-        merged = merged[:limit]
-    return {"count": len(merged), "stixobjects": merged}
-
-def load_indicators(data_dir: str, since: Optional[str] = None, limit: Optional[int] = None) -> Dict[str, Any]:
-    return load_objects(data_dir, since=since, limit=limit, types=["indicator"])
+                days = date(int(s[0:4]), int(s[5:7]), int(s[8:10])).toordinal() - _EPOCH_ORDINAL
+                hh, mm, ss = int(s[11:13]), int(s[14:16]), int(s[17:19])
+                if hh < 24 and mm < 60 and ss < 60:
+                    return (days * 86400 + hh * 3600 + mm * 60 + ss) * 1_000_000 + (int(frac.ljust(6, "0")) if frac else 0)
+            except ValueError:
+                pass
+    return ts_key(_parse_dt(s))
+
+def is_ts(s: str) -> bool:
+    """Whether parse_ts() reads `s` as a timestamp rather than falling back to the epoch."""
+    for fmt in _FORMATS:
+        try:
+            datetime.strptime(s, fmt)
+            return True
+        except ValueError:
+            continue
+    return False
+
+def obj_ts(o: Dict[str, Any]) -> int:
+    """Integer sort key of an object: valid_from, else created."""
+    return parse_ts(o.get("valid_from") or o.get("created") or "1970-01-01T00:00:00Z")
+
+def obj_version(o: Dict[str, Any]) -> int:
+    """Integer version of an object: modified, else created."""
+    return parse_ts(o.get("modified") or o.get("created") or "1970-01-01T00:00:00Z")
+
+def key_iso(ts: int) -> str:
+    """Inverse of ts_key, rendered like the generator's timestamps."""
+    return (_EPOCH + timedelta(microseconds=ts)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
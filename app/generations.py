@@ -0,0 +1,113 @@
+"""Generation numbers shared by every worker serving one DATA_DIR.
+
+Paging tokens and the change feed hand clients a generation, and the next request
+may land on any worker, so a number has to mean the same build in all of them.
+The numbers live in the store's marker file as JSON. Each data file version
+(path, mtime, size) and each removal is numbered by the first worker to apply it,
+under an flock; a worker that gets to the same change later reuses that number,
+and takes in whatever was numbered before its own changes in the same build. So a
+worker at generation N holds the files every other worker at N holds.
+"""
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from .serialize import dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX: a single process, nothing to share
+    fcntl = None
+
+Stat = Tuple[int, int]
+
+def _stat(path: str) -> Optional[Stat]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+class SharedGenerations:
+    """The sequence kept in `path`; the last `keep` removals are remembered for workers yet to notice them."""
+
+    def __init__(self, path: str, keep: int = 4096):
+        self.path = path
+        self.keep = keep
+
+    @contextmanager
+    def _locked(self):
+        if fcntl is None:
+            yield
+            return
+        # the state file itself is replaced on every write, so the lock lives beside it
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "rb") as fh:
+                state = loads(fh.read())
+            if isinstance(state, dict) and isinstance(state.get("generation"), int):
+                state.setdefault("files", {})
+                state.setdefault("removed", [])
+                return state
+        except (OSError, ValueError):
+            pass
+        # missing, or a plain marker from an older version: start a sequence
+        return {"generation": 0, "files": {}, "removed": []}
+
+    def _write(self, state: Dict[str, Any]) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(dumps(state))
+        os.replace(tmp, self.path)
+
+    def number(self, data_dir: str, changed: Dict[str, Stat], removed: Dict[str, Stat], held: Dict[str, Stat],
+               floor: int) -> Tuple[int, Dict[str, int], Dict[str, Tuple[Stat, int]], List[str]]:
+        """Number one build: (its generation, generation per changed path, more, less).
+
+        `changed` and `removed` are the file versions this build loaded and dropped,
+        `held` every file the caller holds once it is applied, and `floor` the caller's
+        current generation, which the build's always exceeds. `more` (path -> (stat,
+        generation)) and `less` are files other workers numbered first that the caller
+        has yet to load or drop; taking them into the same build is what makes its
+        generation mean the same thing everywhere.
+        """
+        rel = lambda p: os.path.relpath(p, data_dir)
+        with self._locked():
+            state = self._read()
+            files, removals = state["files"], state["removed"]
+            n = start = state["generation"]
+            gens: Dict[str, int] = {}
+            for p, st in changed.items():
+                rec = files.get(rel(p))
+                if rec is None or (rec[0], rec[1]) != tuple(st):
+                    n += 1
+                    rec = files[rel(p)] = [st[0], st[1], n]
+                gens[p] = rec[2]
+            known = {(r, m, s) for r, m, s, _ in removals}
+            for p, st in removed.items():
+                if (rel(p), st[0], st[1]) in known:
+                    continue
+                n += 1
+                removals.append([rel(p), st[0], st[1], n])
+                rec = files.get(rel(p))
+                if rec is not None and (rec[0], rec[1]) == tuple(st):
+                    del files[rel(p)]
+            more: Dict[str, Tuple[Stat, int]] = {}
+            for r, (m, s, g) in files.items():
+                p = os.path.join(data_dir, r)
+                if p not in changed and held.get(p) != (m, s) and _stat(p) == (m, s):
+                    more[p] = ((m, s), g)
+            less = [p for p, m, s in ((os.path.join(data_dir, r), m, s) for r, m, s, _ in removals)
+                    if held.get(p) == (m, s)]
+            n = max(n, floor + 1)
+            if n != start:
+                state["generation"] = n
+                del removals[:-self.keep]
+                self._write(state)
+        return n, gens, more, less
@@ -1,6 +1,7 @@
 import os, json, uuid, random
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
+from .segments import write_segment
 
 def utcnow():
     return datetime.now(tz=timezone.utc)
@@ -20,20 +21,22 @@ def rand_ip() -> str:
 def source_ti() -> str:
     return f"STEELCAGE.AI"
 
+DOMAIN_PREFIXES = ['malware','c2','phish','exploit','dropper','payload','beacon','cobra','viper','shadow']
+DOMAIN_MIDDLES = ['control','command','download','update','sync','data','info','stats','telemetry','metrics']
+DOMAIN_TLDS = ['.com','.net','.org','.info','.biz','.io','.tech','.xyz','.online','.site']
+URL_PATHS = ['/api/beacon','/update/check','/data/sync','/get/info','/ping','/cfg/get','/task/poll','/cmd/exec','/file/upload','/log/send']
+URL_PARAMS = ['', '?id=', '?session=', '?key=', '?token=', '?user=']
+TOKEN_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+
 def rand_domain() -> str:
-    prefixes = ['malware','c2','phish','exploit','dropper','payload','beacon','cobra','viper','shadow']
-    middles = ['control','command','download','update','sync','data','info','stats','telemetry','metrics']
-    tlds = ['.com','.net','.org','.info','.biz','.io','.tech','.xyz','.online','.site']
-    return f"{random.choice(prefixes)}-{random.choice(middles)}{random.randint(100,999)}{random.choice(tlds)}"
+    return f"{random.choice(DOMAIN_PREFIXES)}-{random.choice(DOMAIN_MIDDLES)}{random.randint(100,999)}{random.choice(DOMAIN_TLDS)}"
 
 def rand_url() -> str:
     domain = rand_domain()
-    paths = ['/api/beacon','/update/check','/data/sync','/get/info','/ping','/cfg/get','/task/poll','/cmd/exec','/file/upload','/log/send']
-    params = ['', '?id=', '?session=', '?key=', '?token=', '?user=']
-    path = random.choice(paths)
-    param = random.choice(params)
+    path = random.choice(URL_PATHS)
+    param = random.choice(URL_PARAMS)
     if param:
-        token = ''.join(random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789') for _ in range(8))
+        token = ''.join(random.choice(TOKEN_ALPHABET) for _ in range(8))
         param = f"{param}{token}"
     return f"https://{domain}{path}{param}"
 
@@ -43,29 +46,36 @@ def rand_md5() -> str:
 def _md5_32(h: str) -> str:
     return (h.replace('-', '') + '0'*32)[:32]
 
+MALWARE_FAMILIES = ['Emotet','TrickBot','Qbot','Cobalt Strike','Metasploit','Mimikatz','BloodHound','Empire','PsExec']
+THREAT_ACTORS = ['APT28','APT29','Lazarus','FIN7','Carbanak','DarkHydrus','OilRig','MuddyWater','Turla']
+
+KILL_CHAIN_PHASES = [
+    {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "reconnaissance"},
+    {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "weaponization"},
+    {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "delivery"},
+    {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "exploitation"},
+    {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "installation"},
+    {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "command-and-control"},
+    {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "actions-on-objectives"},
+]
+
+ATTACK_PATTERNS = [
+    {"name": "Spearphishing Attachment", "description": "Adversaries send spearphishing emails with malicious attachments", "external_id": "T1566.001", "phases": [KILL_CHAIN_PHASES[2]]},
+    {"name": "Command and Scripting Interpreter", "description": "Abuse of command and script interpreters", "external_id": "T1059", "phases": [KILL_CHAIN_PHASES[3], KILL_CHAIN_PHASES[4]]},
+    {"name": "Remote System Discovery", "description": "Discovery of systems on the network", "external_id": "T1018", "phases": [KILL_CHAIN_PHASES[0], KILL_CHAIN_PHASES[6]]},
+    {"name": "Credential Dumping", "description": "Dumping credentials to obtain account info", "external_id": "T1003", "phases": [KILL_CHAIN_PHASES[6]]},
+]
+
 def generate_payload(min_count: int = 10, max_count: int = 25) -> Dict[str, Any]:
     now = utcnow()
     valid_from = now - timedelta(days=random.randint(0, 10), hours=random.randint(0, 23))
     indicator_count = max(min_count, 1) if min_count == max_count else random.randint(min_count, max_count)
 
-    malware_families = ['Emotet','TrickBot','Qbot','Cobalt Strike','Metasploit','Mimikatz','BloodHound','Empire','PsExec']
-    threat_actors = ['APT28','APT29','Lazarus','FIN7','Carbanak','DarkHydrus','OilRig','MuddyWater','Turla']
-
-    kill_chain_phases = [
-        {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "reconnaissance"},
-        {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "weaponization"},
-        {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "delivery"},
-        {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "exploitation"},
-        {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "installation"},
-        {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "command-and-control"},
-        {"kill_chain_name": "lockheed-martin-cyber-kill-chain", "phase_name": "actions-on-objectives"},
-    ]
-
     stixobjects: List[Dict[str, Any]] = []
 
     # Identities (first three actors)
     identities = []
-    for actor in threat_actors[:3]:
+    for actor in THREAT_ACTORS[:3]:
         identity = {
             "type": "identity",
             "spec_version": "2.1",
@@ -86,8 +96,8 @@ def generate_payload(min_count: int = 10, max_count: int = 25) -> Dict[str, Any]
     indicator_ids: List[str] = []
     for _ in range(indicator_count):
         itype = random.choice(['ipv4','domain','url','file-hash'])
-        malware = random.choice(malware_families)
-        actor = random.choice(threat_actors)
+        malware = random.choice(MALWARE_FAMILIES)
+        actor = random.choice(THREAT_ACTORS)
         confidence = random.randint(60, 100)
         indicator = {
             "type": "indicator",
@@ -106,37 +116,30 @@ def generate_payload(min_count: int = 10, max_count: int = 25) -> Dict[str, Any]
             indicator["pattern"] = f"[ipv4-addr:value = '{ip}']"
             indicator["name"] = f"Malicious IP - {malware} C2"
             indicator["description"] = f"IP address associated with {malware} activity attributed to threat actor: {actor}."
-            indicator["kill_chain_phases"] = [ kill_chain_phases[5] ]
+            indicator["kill_chain_phases"] = [ KILL_CHAIN_PHASES[5] ]
         elif itype == 'domain':
             dom = rand_domain()
             indicator["pattern"] = f"[domain-name:value = '{dom}']"
             indicator["name"] = f"Malicious Domain - {malware}"
             indicator["description"] = f"Domain used by {malware} infrastructure attributed to threat actor: {actor}."
-            indicator["kill_chain_phases"] = [ kill_chain_phases[5], kill_chain_phases[4] ]
+            indicator["kill_chain_phases"] = [ KILL_CHAIN_PHASES[5], KILL_CHAIN_PHASES[4] ]
         elif itype == 'url':
             u = rand_url()
             indicator["pattern"] = f"[url:value = '{u}']"
             indicator["name"] = f"Malicious URL - {malware}"
             indicator["description"] = f"URL serving {malware} payload attributed to {actor} campaign."
-            indicator["kill_chain_phases"] = [ kill_chain_phases[2], kill_chain_phases[3] ]
+            indicator["kill_chain_phases"] = [ KILL_CHAIN_PHASES[2], KILL_CHAIN_PHASES[3] ]
         else:
             h = _md5_32(rand_md5())
             indicator["pattern"] = f"[file:hashes.MD5 = '{h}']"
             indicator["name"] = f"Malicious File Hash - {malware}"
             indicator["description"] = f"MD5 hash of {malware} variant associated with {actor} operations."
-            indicator["kill_chain_phases"] = [ kill_chain_phases[1], kill_chain_phases[2], kill_chain_phases[4] ]
+            indicator["kill_chain_phases"] = [ KILL_CHAIN_PHASES[1], KILL_CHAIN_PHASES[2], KILL_CHAIN_PHASES[4] ]
         stixobjects.append(indicator)
         indicator_ids.append(indicator["id"])
 
-    attack_patterns_src = [
-        {"name": "Spearphishing Attachment", "description": "Adversaries send spearphishing emails with malicious attachments", "external_id": "T1566.001", "phases": [kill_chain_phases[2]]},
-        {"name": "Command and Scripting Interpreter", "description": "Abuse of command and script interpreters", "external_id": "T1059", "phases": [kill_chain_phases[3], kill_chain_phases[4]]},
-        {"name": "Remote System Discovery", "description": "Discovery of systems on the network", "external_id": "T1018", "phases": [kill_chain_phases[0], kill_chain_phases[6]]},
-        {"name": "Credential Dumping", "description": "Dumping credentials to obtain account info", "external_id": "T1003", "phases": [kill_chain_phases[6]]},
-    ]
-
     attack_pattern_ids: List[str] = []
-    for ap in attack_patterns_src:
+    for ap in ATTACK_PATTERNS:
         ap_obj = {
             "type": "attack-pattern",
             "spec_version": "2.1",
@@ -207,10 +210,28 @@ def generate_payload(min_count: int = 10, max_count: int = 25) -> Dict[str, Any]
     }
     return payload
 
-def write_payload(output_dir: str, payload: Dict[str, Any]) -> str:
+SNAPSHOT_FORMATS = ("json", "segment")
+
+def write_payload(output_dir: str, payload: Dict[str, Any], fmt: str = "json") -> str:
+    if fmt not in SNAPSHOT_FORMATS:
+        raise ValueError(f"unsupported format: {fmt}")
     os.makedirs(output_dir, exist_ok=True)
     ts = iso_z(utcnow()).replace(":", "").replace("-", "")
+    if fmt == "segment":
+        return write_segment(output_dir, f"indicators_{ts}", payload.get("stixobjects", []))
     out_path = os.path.join(output_dir, f"indicators_{ts}.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
+    # readers only look at *.json, so they never see the temp file; os.replace makes the final name appear whole
+    tmp_path = os.path.join(output_dir, f".indicators_{ts}.json.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
     return out_path
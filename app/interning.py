@@ -0,0 +1,115 @@
+"""Compact in-memory object bodies: serialized fields, with repeated runs shared.
+
+Generated and vendor feeds repeat most of every object: `type`/`spec_version`,
+`source`, batch timestamps, descriptions, `labels`, `kill_chain_phases`. A body is
+kept as a Packed tuple of byte runs, alternating between runs of fields that
+identify the object (never shared) and runs of everything else, which are
+interned so equal runs across objects are one bytes object. The runs are slices
+of the object's dumps(), so joining them gives back exactly those bytes: serving
+a body is a join and nothing is re-encoded.
+"""
+import sys
+from typing import Any, Dict, Iterable, List, Tuple, Union
+from .serialize import dumps
+
+# properties that identify one object or point at others: sharing them would only grow the table
+UNIQUE_FIELDS = frozenset(("id", "pattern", "source_ref", "target_ref", "sighting_of_ref", "object_refs", "where_sighted_refs"))
+
+class Packed(tuple):
+    """An object body as byte runs; b"".join(packed) is its compact JSON."""
+    __slots__ = ()
+
+def intern(value: Any) -> Any:
+    """sys.intern for the small vocabularies repeated per object (types, relationship types); other values pass through."""
+    return sys.intern(value) if type(value) is str else value
+
+def materialize(raw) -> bytes:
+    """Bytes of a store body: plain bytes, a Packed body or a (segment, offset, length) reference."""
+    if isinstance(raw, bytes):
+        return raw
+    if isinstance(raw, Packed):
+        return b"".join(raw)
+    return raw[0].read(raw[1], raw[2])
+
+class Interner:
+    """Packs bodies against a shared table of runs. Not thread-safe: the store packs under its lock.
+
+    Each run shape (object type, position) is probed `probe` times; shapes whose
+    runs rarely repeat (under `min_hit_ratio`) stop being interned, and the table
+    stops growing at `max_runs` entries.
+    """
+
+    def __init__(self, max_runs: int = 1 << 20, probe: int = 1024, min_hit_ratio: float = 0.1):
+        self.max_runs = max_runs
+        self.probe = probe
+        self.min_hit_ratio = min_hit_ratio
+        self._runs: Dict[bytes, bytes] = {}
+        self._shapes: Dict[Tuple[Any, int], List[int]] = {}
+        self._names: Dict[str, bytes] = {}
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def prune(self, bodies: Iterable[Any]) -> None:
+        """Forget the runs none of `bodies` (every body still held) uses, e.g. once files were dropped."""
+        runs = self._runs
+        kept: Dict[bytes, bytes] = {}
+        for body in bodies:
+            if type(body) is Packed:
+                # runs alternate shared, unique, shared...: only the shared ones can be in the table
+                shared = body[::2]
+            elif type(body) is bytes:
+                shared = (body,)
+            else:
+                continue
+            for run in shared:
+                if runs.get(run) is run:
+                    kept[run] = run
+        self._runs = kept
+
+    def _share(self, shape: Tuple[Any, int], run: bytes) -> bytes:
+        stats = self._shapes.get(shape)
+        if stats is None:
+            stats = self._shapes[shape] = [0, 0]
+        elif stats[0] >= self.probe and stats[1] < stats[0] * self.min_hit_ratio:
+            return run
+        stats[0] += 1
+        got = self._runs.get(run)
+        if got is not None:
+            stats[1] += 1
+            return got
+        if len(self._runs) < self.max_runs:
+            self._runs[run] = run
+        return run
+
+    def pack(self, obj: Dict[str, Any]) -> Union[bytes, Packed]:
+        raw = dumps(obj)
+        otype = obj.get("type")
+        names = self._names
+        parts: List[bytes] = []
+        # end of the last unique run taken; parts[-1] is always that run
+        done = 0
+        for k, v in obj.items():
+            if k not in UNIQUE_FIELDS:
+                continue
+            name = names.get(k)
+            if name is None:
+                name = names[k] = dumps(k) + b":"
+            field = name + dumps(v)
+            start = raw.find(field, done)
+            if start < 0:
+                continue
+            end = start + len(field)
+            # take the separator along, so adjacent unique fields make one run
+            if start > done and raw[start - 1] == 0x2C:
+                start -= 1
+            if start > done:
+                parts.append(self._share((otype, len(parts)), raw[done:start]))
+                parts.append(raw[start:end])
+            else:
+                parts[-1] += raw[start:end]
+            done = end
+        if not parts:
+            return self._share((otype, 0), raw)
+        parts.append(self._share((otype, len(parts)), raw[done:]))
+        return Packed(parts)
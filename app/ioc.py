@@ -0,0 +1,48 @@
+"""Observable extraction from STIX indicator patterns, feeding the store's IOC index.
+
+Only equality comparisons on the observable paths below are indexed; anything else
+in a pattern (other operators, non-observable objects like the generator's
+`[identity:name = '...']`) is ignored. Values are normalized the same way at
+ingest and at lookup, so callers can pass them as they find them.
+"""
+import re
+from typing import List, Optional, Tuple
+
+IOC_TYPES = ("ipv4", "ipv6", "domain", "url", "email", "md5", "sha1", "sha256")
+
+# object:path = 'value', with \' and \\ escapes inside the quotes
+_COMPARISON = re.compile(r"([a-z0-9-]+):([A-Za-z0-9_.'-]+)\s*=\s*'((?:[^'\\]|\\.)*)'")
+
+_PATHS = {
+    ("ipv4-addr", "value"): "ipv4",
+    ("ipv6-addr", "value"): "ipv6",
+    ("domain-name", "value"): "domain",
+    ("url", "value"): "url",
+    ("email-addr", "value"): "email",
+}
+
+_HASHES = {"md5": "md5", "sha-1": "sha1", "sha1": "sha1", "sha-256": "sha256", "sha256": "sha256"}
+
+def _kind(obj_type: str, path: str) -> Optional[str]:
+    kind = _PATHS.get((obj_type, path))
+    if kind is None and obj_type == "file" and path.startswith("hashes."):
+        kind = _HASHES.get(path[7:].strip("'").lower())
+    return kind
+
+def normalize(kind: str, value: str) -> str:
+    value = value.strip()
+    if kind in ("domain", "email"):
+        return value.lower().rstrip(".")
+    if kind in ("md5", "sha1", "sha256", "ipv6"):
+        return value.lower()
+    return value
+
+def parse_pattern(pattern: str) -> List[Tuple[str, str]]:
+    """(ioc type, normalized value) for every indexable comparison in a STIX pattern."""
+    out: List[Tuple[str, str]] = []
+    for obj_type, path, value in _COMPARISON.findall(pattern):
+        kind = _kind(obj_type, path)
+        if kind is not None:
+            value = value.replace("\\'", "'").replace("\\\\", "\\")
+            out.append((kind, normalize(kind, value)))
+    return out
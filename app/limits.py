@@ -0,0 +1,128 @@
+"""Per-client token buckets, per-client and global in-flight caps.
+
+Runs as pure ASGI middleware on the event loop, so the counters need no locks and a
+request that is let through costs a dict lookup and a little arithmetic. Clients
+are identified by API key digest (see app.auth.client_key), or by address when
+they present no valid key.
+"""
+import math, time
+from typing import Dict, Iterable
+from .auth import client_key
+from .metrics import REGISTRY, Counter
+
+REJECTED = REGISTRY.register(Counter(
+    "rate_limit_rejections_total", "Requests refused by the limiter: rate (429), concurrency (429) or shed (503).", ("reason",)))
+
+class TokenBucket:
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.stamp = now
+
+    def take(self, rate: float, capacity: float, now: float) -> float:
+        """0 if a token was taken, else seconds until one is available."""
+        self.tokens = min(capacity, self.tokens + (now - self.stamp) * rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+class RateLimitMiddleware:
+    """Refuse early, before routing, so an abusive client costs as little as possible.
+
+    `rate`/`burst` configure each client's bucket (rate 0 disables it),
+    `max_inflight_per_client` caps its concurrent requests and `max_inflight` sheds
+    load for everyone once that many requests are in progress (0 disables either).
+    Paths in `exempt` (health and metrics probes) are never limited. Requests to
+    `held` paths (long polls and streams) are mostly idle for as long as they are
+    open, so they don't count as in flight: they take a token like any request and
+    are capped per client by `max_held_per_client` instead.
+    """
+
+    def __init__(self, app, rate: float = 0.0, burst: float = 0.0, max_inflight_per_client: int = 0, max_inflight: int = 0,
+                 exempt: Iterable[str] = (), max_clients: int = 100_000, held: Iterable[str] = (), max_held_per_client: int = 0):
+        self.app = app
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_inflight_per_client = max_inflight_per_client
+        self.max_inflight = max_inflight
+        self.exempt = frozenset(exempt)
+        self.max_clients = max_clients
+        self.held = frozenset(held)
+        self.max_held_per_client = max_held_per_client
+        self.inflight = 0
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._client_inflight: Dict[str, int] = {}
+        self._client_held: Dict[str, int] = {}
+
+    def _client(self, scope) -> str:
+        authorization = x_api_key = None
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+            elif name == b"x-api-key":
+                x_api_key = value.decode("latin-1")
+        key = client_key(authorization, x_api_key)
+        if key is not None:
+            return "key:" + key
+        client = scope.get("client")
+        return "addr:" + (client[0] if client else "unknown")
+
+    def _bucket(self, client: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= self.max_clients:
+                # forget clients whose bucket has refilled: they would start full anyway
+                idle = now - self.burst / self.rate
+                self._buckets = {c: b for c, b in self._buckets.items() if b.stamp > idle}
+            bucket = self._buckets[client] = TokenBucket(self.burst, now)
+        return bucket
+
+    async def _reject(self, send, status: int, retry_after: float, reason: str) -> None:
+        REJECTED.inc(1, reason)
+        body = b'{"detail":"' + (b"Too Many Requests" if status == 429 else b"Service Unavailable") + b'"}'
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("ascii")),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exempt:
+            await self.app(scope, receive, send)
+            return
+        if self.max_inflight and self.inflight >= self.max_inflight:
+            await self._reject(send, 503, 1, "shed")
+            return
+        client = self._client(scope)
+        if self.rate > 0:
+            now = time.monotonic()
+            wait = self._bucket(client, now).take(self.rate, self.burst, now)
+            if wait:
+                await self._reject(send, 429, wait, "rate")
+                return
+        held = scope.get("path") in self.held
+        if held:
+            counts, cap = self._client_held, self.max_held_per_client
+        else:
+            counts, cap = self._client_inflight, self.max_inflight_per_client
+        running = counts.get(client, 0)
+        if cap and running >= cap:
+            await self._reject(send, 429, 1, "concurrency")
+            return
+        counts[client] = running + 1
+        if not held:
+            self.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not held:
+                self.inflight -= 1
+            left = counts[client] - 1
+            if left:
+                counts[client] = left
+            else:
+                del counts[client]
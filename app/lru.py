@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+class ByteLRU:
+    """Thread-safe LRU bounded by the byte size of its values.
+
+    No single value may take more than a quarter of the budget (`max_entry`):
+    one oversized value must not flush everything else.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry = max_bytes // 4
+        self._items: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._get(key)
+
+    def put(self, key: Hashable, value: Any, nbytes: Optional[int] = None) -> None:
+        """Keep `value` (of `nbytes`, len(value) by default) unless it is over `max_entry`."""
+        with self._lock:
+            self._put(key, value, len(value) if nbytes is None else nbytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    # the underscored forms expect the caller to hold _lock
+
+    def _get(self, key: Hashable) -> Optional[Any]:
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def _put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        if nbytes > self.max_entry:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._size -= old[1]
+        self._items[key] = (value, nbytes)
+        self._size += nbytes
+        while self._size > self.max_bytes and self._items:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self._size -= evicted
+            self.evictions += 1
@@ -1,14 +1,28 @@
-import os, asyncio, hashlib
+import os, asyncio, hashlib, time
 from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
 from fastapi import FastAPI, Query, Request, HTTPException, Depends
-from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from .file_store import load_indicators, load_objects
-from .generator import generate_payload, write_payload
+from .store import ObjectStore
+from .generator import SNAPSHOT_FORMATS, generate_payload, write_payload
+from .compaction import compact
+from .leader import LeaderLock
 from .paging import encode_token, decode_token
+from .streaming import NDJSON_MEDIA_TYPE, STREAM_MODES, ndjson_chunks, bundle_chunks
+from .serialize import assemble, dumps
+from .compression import BodyCache, negotiate, compress, compress_chunks
+from .querycache import QueryCache
 from .auth import require_api_key
+from .limits import RateLimitMiddleware
+from .watcher import DirectoryWatcher
+from .changefeed import SSE_MEDIA_TYPE, ChangeNotifier, delta, sse_message
+from .file_store import is_ts, parse_ts, key_iso
+from .ioc import IOC_TYPES, normalize
+from .metrics import (REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, Counter, Gauge, MetricsMiddleware, PHASE_SECONDS,
+                      GENERATOR_SECONDS, GENERATOR_OBJECTS, GENERATOR_LAST_OBJECTS)
 
 load_dotenv()
 
@@ -21,6 +35,10 @@ GENERATE_EVERY_SECONDS = int(os.getenv("GENERATE_EVERY_SECONDS", str(3 * 60 * 60
 GENERATE_ON_START = os.getenv("GENERATE_ON_START", "true").lower() == "true"
 MIN_COUNT = int(os.getenv("MIN_COUNT", "10"))
 MAX_COUNT = int(os.getenv("MAX_COUNT", "25"))
+COMPACT_EVERY_SECONDS = int(os.getenv("COMPACT_EVERY_SECONDS", "0"))
+COMPACT_MIN_FILES = int(os.getenv("COMPACT_MIN_FILES", "8"))
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_MAX_OBJECTS = int(os.getenv("RETENTION_MAX_OBJECTS", "0"))
 
 TAXII_API_ROOT_PATH = os.getenv("TAXII_API_ROOT_PATH", "/taxii2/root")
 COLLECTION_ID = os.getenv("COLLECTION_ID", "indicators")
@@ -28,9 +46,75 @@ COLLECTION_TITLE = os.getenv("COLLECTION_TITLE", "Synthetic Indicators (STIX 2.1
 TAXII_INDICATORS_ONLY = os.getenv("TAXII_INDICATORS_ONLY", "false").lower() == "true"
 SOURCE_SYSTEM = os.getenv("SOURCE_SYSTEM", "STEELCAGE.AI X-GEN TI PLATFORM")
 API_VERSION = os.getenv("API_VERSION", "1702.93.3082")
-API_KEYS = os.getenv("API_KEYS", "").split(",")
+STORE_REFRESH_SECONDS = float(os.getenv("STORE_REFRESH_SECONDS", "1"))
+STORE_RESCAN_SECONDS = float(os.getenv("STORE_RESCAN_SECONDS", "30"))
+WORKERS = int(os.getenv("WORKERS", "1"))
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "5"))
+# workers don't share memory: only segments (mmap'd, so in the page cache once) keep one copy across them
+SNAPSHOT_FORMAT = (os.getenv("SNAPSHOT_FORMAT") or ("segment" if WORKERS > 1 else "json")).lower()
+if SNAPSHOT_FORMAT not in SNAPSHOT_FORMATS:
+    # caught at boot rather than by the first scheduled generation
+    raise ValueError(f"SNAPSHOT_FORMAT must be one of {', '.join(SNAPSHOT_FORMATS)}, not {SNAPSHOT_FORMAT!r}")
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+COMPRESSION_CACHE_MB = int(os.getenv("COMPRESSION_CACHE_MB", "64"))
+QUERY_CACHE_MB = int(os.getenv("QUERY_CACHE_MB", "64"))
+IOC_BATCH_MAX = int(os.getenv("IOC_BATCH_MAX", "50000"))
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+MAX_INFLIGHT_PER_KEY = int(os.getenv("MAX_INFLIGHT_PER_KEY", "8"))
+MAX_INFLIGHT = int(os.getenv("MAX_INFLIGHT", "64"))
+MAX_HELD_PER_KEY = int(os.getenv("MAX_HELD_PER_KEY", "16"))
+WATCH_DATA_DIR = os.getenv("WATCH_DATA_DIR", "true").lower() == "true"
+WATCH_POLLING = os.getenv("WATCH_POLLING", "false").lower() == "true"
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "1"))
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "2"))
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(DATA_DIR, ".store.ckpt"))
+CHECKPOINT_EVERY_SECONDS = float(os.getenv("CHECKPOINT_EVERY_SECONDS", "60"))
+CHANGES_WAIT_MAX_SECONDS = float(os.getenv("CHANGES_WAIT_MAX_SECONDS", "60"))
+CHANGES_HEARTBEAT_SECONDS = float(os.getenv("CHANGES_HEARTBEAT_SECONDS", "15"))
+
+# the ?stream= values every streaming endpoint accepts
+_STREAM_PATTERN = "^(" + "|".join(STREAM_MODES) + ")$"
+
+# with several workers, the marker holds the generation numbers they share and moves on every change,
+# so workers only walk DATA_DIR when it moved (or every STORE_RESCAN_SECONDS)
+STORE = ObjectStore(DATA_DIR, refresh_interval=STORE_REFRESH_SECONDS,
+                    marker=os.path.join(DATA_DIR, ".generation") if WORKERS > 1 else None,
+                    rescan_interval=STORE_RESCAN_SECONDS)
+LEADER = LeaderLock(os.path.join(DATA_DIR, ".generator.lock"))
+WATCHER = DirectoryWatcher(STORE, debounce=WATCH_DEBOUNCE_SECONDS, poll_interval=WATCH_POLL_SECONDS,
+                           rescan_interval=max(STORE_RESCAN_SECONDS, WATCH_POLL_SECONDS), poll=WATCH_POLLING)
+NOTIFIER = ChangeNotifier()
+STORE.subscribe(NOTIFIER.notify)
+BODY_CACHE = BodyCache(COMPRESSION_CACHE_MB * 1024 * 1024)
+QUERY_CACHE = QueryCache(QUERY_CACHE_MB * 1024 * 1024)
+# keys carry the generation already; clearing just frees the old build's pages right away
+STORE.subscribe(lambda generation: QUERY_CACHE.clear())
+
+REGISTRY.register(Gauge("store_objects", "Objects currently served from the in-memory store.", fn=lambda: len(STORE)))
+REGISTRY.register(Gauge("store_generation", "Store build generation; bumps whenever DATA_DIR changes.", fn=lambda: STORE.generation))
+REGISTRY.register(Counter("cache_events_total", "Cache lookups and evictions.", ("cache", "event"), fn=lambda: {
+    ("compressed_body", "hit"): BODY_CACHE.hits,
+    ("compressed_body", "miss"): BODY_CACHE.misses,
+    ("compressed_body", "eviction"): BODY_CACHE.evictions,
+    ("query_result", "hit"): QUERY_CACHE.hits,
+    ("query_result", "miss"): QUERY_CACHE.misses,
+    ("query_result", "eviction"): QUERY_CACHE.evictions,
+    ("query_result", "coalesced"): QUERY_CACHE.coalesced,
+}))
+REGISTRY.register(Gauge("cache_hit_ratio", "Hits / lookups since start.", ("cache",), fn=lambda: {
+    ("compressed_body",): BODY_CACHE.hits / max(BODY_CACHE.hits + BODY_CACHE.misses, 1),
+    ("query_result",): (QUERY_CACHE.hits + QUERY_CACHE.coalesced) / max(QUERY_CACHE.hits + QUERY_CACHE.coalesced + QUERY_CACHE.misses, 1),
+}))
 
 app = FastAPI(title="Mock X-GEN TI REST API", version=API_VERSION, description="Mock X-GEN STIX/TAXII 2.1 Threat Intelligence REST API")
+# limits sit inside the metrics middleware, so refusals are still timed and counted per status; they are
+# refused before routing, so their route label is "unmatched" (rate_limit_rejections_total has the reason)
+app.add_middleware(RateLimitMiddleware, rate=RATE_LIMIT_PER_SECOND, burst=RATE_LIMIT_BURST,
+                   max_inflight_per_client=MAX_INFLIGHT_PER_KEY, max_inflight=MAX_INFLIGHT, exempt=("/healthz", "/metrics"),
+                   held=("/api/v1/changes", "/api/v1/changes/stream"), max_held_per_client=MAX_HELD_PER_KEY)
+app.add_middleware(MetricsMiddleware)
 
 if CORS_ORIGINS:
     app.add_middleware(
@@ -47,69 +131,283 @@ def _parse_types_param(types_param: Optional[str]) -> Optional[List[str]]:
     parts = [t.strip() for t in types_param.split(",") if t.strip()]
     return parts or None
 
-def _collect_items(since: Optional[str], types: Optional[List[str]]) -> List[Dict[str, Any]]:
-    merged = load_objects(DATA_DIR, since=since, limit=10_000, types=types)["stixobjects"]
-    return merged
-
-def _page(items: List[Dict[str, Any]], offset: int, page_size: int):
-    total = len(items)
-    start = max(offset, 0)
-    end = min(start + page_size, total)
-    slice_ = items[start:end]
-    more = end < total
-    next_token = encode_token(end) if more else None
+def _route(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def _hashable(value: Any) -> Any:
+    # list filters (ids, versions) are sets to the store, so their order must not split keys
+    return tuple(sorted(set(value))) if isinstance(value, (list, set, frozenset)) else value
+
+def _page(request: Request, since: Optional[str], types: Optional[List[str]], page_size: Optional[int], token: Optional[str],
+          **filters):
+    args = dict(filters, **decode_token(token))
+    timings: Dict[str, float] = {}
+    # one build for both the key and the page, so a result is never filed under another build
+    view = STORE.current(args.get("as_of"))
+
+    def _compute():
+        return STORE.page(since=since, types=types, size=page_size, raw=True, timings=timings, view=view, **args)
+
+    if QUERY_CACHE.max_bytes > 0:
+        # type order never changes a result; the fingerprint (which files, as of which mtimes) ties keys to
+        # this store's build and retires them with it
+        key = (view.fingerprint, view.generation, since, tuple(sorted(set(types))) if types else None, page_size,
+               tuple(sorted((k, _hashable(v)) for k, v in args.items())))
+        slice_, total, after = QUERY_CACHE.get_or_compute(key, _compute, lambda r: sum(map(len, r[0])) + 256)
+    else:
+        slice_, total, after = _compute()
+    route = _route(request)
+    # empty on a hit or when another request computed the page
+    for phase, seconds in timings.items():
+        PHASE_SECONDS.observe(seconds, route, phase)
+    more = after is not None
+    next_token = encode_token(*after) if more else None
     return slice_, total, more, next_token
 
+def _send(request: Request, envelope: Dict[str, Any], key: str, page: List[bytes], media_type: str,
+          validators: Dict[str, str]) -> Response:
+    route = _route(request)
+    t0 = time.perf_counter()
+    body = assemble(envelope, key, page)
+    t1 = time.perf_counter()
+    PHASE_SECONDS.observe(t1 - t0, route, "serialize")
+    headers = dict(validators, Vary="Accept-Encoding")
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding and len(body) >= COMPRESSION_MIN_BYTES:
+        body = compress(body, encoding, COMPRESSION_LEVEL)
+        PHASE_SECONDS.observe(time.perf_counter() - t1, route, "compress")
+        headers["Content-Encoding"] = encoding
+        BODY_CACHE.keep((validators["ETag"], encoding), body, media_type, headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def _stream(request: Request, mode: str, since: Optional[str], types: Optional[List[str]], envelope, key: str,
+            media_type: str = "application/json", headers: Optional[Dict[str, str]] = None,
+            filters: Optional[Dict[str, Any]] = None):
+    total, objects = STORE.scan(since=since, types=types, raw=True, **(filters or {}))
+    headers = dict(headers or {}, **{"X-Total-Count": str(total), "Vary": "Accept-Encoding"})
+    if mode == "ndjson":
+        media_type = NDJSON_MEDIA_TYPE
+        chunks = ndjson_chunks(objects)
+    else:
+        chunks = bundle_chunks(envelope(total), key, objects)
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding and "ETag" in headers:
+        headers["Content-Encoding"] = encoding
+        chunks = BODY_CACHE.tee((headers["ETag"], encoding), compress_chunks(chunks, encoding, COMPRESSION_LEVEL),
+                                media_type, headers)
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
 def _httpdate(dt: datetime) -> str:
     dt = dt.astimezone(timezone.utc)
     return dt.strftime("%a, %d %b %Y %H:%M:%S GMT")
 
-def _max_timestamp(items: List[Dict[str, Any]]) -> datetime:
-    def _get_ts(o: Dict[str, Any]) -> datetime:
-        ts = o.get("valid_from") or o.get("created") or "1970-01-01T00:00:00Z"
-        try:
-            return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
-        except ValueError:
-            try:
-                return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-            except ValueError:
-                return datetime(1970,1,1,tzinfo=timezone.utc)
-    if not items:
-        return datetime(1970,1,1,tzinfo=timezone.utc)
-    return max(_get_ts(o) for o in items)
-
-def _build_etag(items: List[Dict[str, Any]], extras: str = "") -> str:
-    lm = _max_timestamp(items).isoformat()
-    import hashlib
-    h = hashlib.sha256((lm + "|" + str(len(items)) + "|" + extras).encode("utf-8")).hexdigest()
+def _build_etag(fingerprint: str, extras: str = "") -> str:
+    h = hashlib.sha256((fingerprint + "|" + extras).encode("utf-8")).hexdigest()
     return f'W/"{h[:16]}"'
 
+def _validators(request: Request, extras: str = "") -> Dict[str, str]:
+    # keyed on the store build plus the exact query, so no object has to be touched to compute them
+    t0 = time.perf_counter()
+    view = STORE.current()
+    PHASE_SECONDS.observe(time.perf_counter() - t0, _route(request), "scan_parse")
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    etag = _build_etag(view.fingerprint, f"{request.url.path}?{query}|{extras}")
+    last_modified = _httpdate(datetime.fromtimestamp(int(view.last_modified), tz=timezone.utc))
+    return {"ETag": etag, "Last-Modified": last_modified}
+
+def _not_modified(request: Request, validators: Dict[str, str]) -> Optional[Response]:
+    inm = request.headers.get("if-none-match")
+    ims = request.headers.get("if-modified-since")
+    if inm:
+        if validators["ETag"] in [t.strip() for t in inm.split(",")] or inm.strip() == "*":
+            return Response(status_code=304, headers=validators)
+        return None
+    if ims:
+        try:
+            ims_dt = datetime.strptime(ims, "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=timezone.utc)
+            lm_dt = datetime.strptime(validators["Last-Modified"], "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=timezone.utc)
+            if lm_dt <= ims_dt:
+                return Response(status_code=304, headers=validators)
+        except Exception:
+            pass
+    return None
+
+def _precompressed(request: Request, validators: Dict[str, str]) -> Optional[Response]:
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding is None:
+        return None
+    cached = BODY_CACHE.get((validators["ETag"], encoding))
+    if cached is None:
+        return None
+    # the media type and headers the body first went out with (a stream's differ from a page's)
+    body, media_type, headers = cached
+    return Response(content=body, media_type=media_type, headers=dict(headers, **validators))
+
+def _preflight(request: Request, extras: str = ""):
+    # 304 or an already-compressed body for this exact build and query: nothing to rebuild
+    validators = _validators(request, extras)
+    early = _not_modified(request, validators) or _precompressed(request, validators)
+    return validators, early
+
+def _generate_once() -> str:
+    started = time.perf_counter()
+    payload = generate_payload(min_count=MIN_COUNT, max_count=MAX_COUNT)
+    path = write_payload(DATA_DIR, payload, fmt=SNAPSHOT_FORMAT)
+    STORE.ingest(path)
+    count = len(payload["stixobjects"])
+    GENERATOR_SECONDS.observe(time.perf_counter() - started)
+    GENERATOR_OBJECTS.inc(count)
+    GENERATOR_LAST_OBJECTS.set(count)
+    return path
+
+def _compact_once() -> Dict[str, Any]:
+    return compact(DATA_DIR, max_age_days=RETENTION_MAX_AGE_DAYS, max_objects=RETENTION_MAX_OBJECTS,
+                   min_files=COMPACT_MIN_FILES, store=STORE)
+
+def _warm_start() -> None:
+    started = time.perf_counter()
+    # files changed since the checkpoint (all of them, without one) are read as usual
+    restored = STORE.warm_start(CHECKPOINT_PATH if CHECKPOINT_EVERY_SECONDS > 0 else None)
+    print(f"[store] ready: {len(STORE)} objects ({restored} files from checkpoint) in {time.perf_counter() - started:.2f}s")
+
+_checkpointed = -1
+
+def _checkpoint_once() -> None:
+    global _checkpointed
+    if not STORE.ready or STORE.generation == _checkpointed:
+        return
+    _checkpointed = STORE.save_checkpoint(CHECKPOINT_PATH)
+
+_generator_task: Optional[asyncio.Task] = None
+_compaction_task: Optional[asyncio.Task] = None
+_boot_task: Optional[asyncio.Task] = None
+_checkpoint_task: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def _load_store():
+    global _boot_task
+    # requests leave DATA_DIR to the boot load (and then the watcher); until it is in, /healthz and the
+    # data endpoints answer 503
+    STORE.managed = True
+
+    async def _boot():
+        try:
+            await asyncio.to_thread(_warm_start)
+        except Exception as e:
+            print(f"[store] warm start failed: {e}")
+        finally:
+            if WATCH_DATA_DIR:
+                # every worker watches for itself, so files copied into DATA_DIR reach all of them within the debounce
+                WATCHER.start()
+            else:
+                STORE.managed = False
+
+    _boot_task = asyncio.create_task(_boot())
+
 @app.on_event("startup")
 async def _start_generator():
-    if GENERATE_ON_START:
-        payload = generate_payload(min_count=MIN_COUNT, max_count=MAX_COUNT)
-        write_payload(DATA_DIR, payload)
+    global _generator_task
 
     async def _loop():
+        # one generator per DATA_DIR: followers wait here and take over if the leader exits
+        while not LEADER.try_acquire():
+            await asyncio.sleep(LEADER_RETRY_SECONDS)
+        # generation and the disk write run in a worker thread so requests keep flowing
+        first = GENERATE_ON_START
         while True:
             try:
-                await asyncio.sleep(GENERATE_EVERY_SECONDS)
-                payload = generate_payload(min_count=MIN_COUNT, max_count=MAX_COUNT)
-                write_payload(DATA_DIR, payload)
+                if not first:
+                    await asyncio.sleep(GENERATE_EVERY_SECONDS)
+                first = False
+                await asyncio.to_thread(_generate_once)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 print(f"[generator] error: {e}")
                 await asyncio.sleep(10)
 
-    asyncio.create_task(_loop())
+    _generator_task = asyncio.create_task(_loop())
+
+@app.on_event("startup")
+async def _start_compaction():
+    global _compaction_task
+    if COMPACT_EVERY_SECONDS <= 0:
+        return
+
+    async def _loop():
+        while True:
+            try:
+                await asyncio.sleep(COMPACT_EVERY_SECONDS)
+                if not LEADER.held:
+                    continue
+                report = await asyncio.to_thread(_compact_once)
+                if report["files_merged"]:
+                    print(f"[compaction] merged {report['files_merged']} files: "
+                          f"{report['objects_reclaimed']} objects ({report['duplicates']} duplicate, {report['expired']} expired) "
+                          f"and {report['bytes_reclaimed']} bytes reclaimed in {report['seconds']}s")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[compaction] error: {e}")
+
+    _compaction_task = asyncio.create_task(_loop())
+
+@app.on_event("startup")
+async def _start_change_feed():
+    NOTIFIER.attach(asyncio.get_running_loop())
+
+@app.on_event("startup")
+async def _start_checkpointing():
+    global _checkpoint_task
+    if CHECKPOINT_EVERY_SECONDS <= 0:
+        return
+
+    async def _loop():
+        while True:
+            try:
+                await asyncio.sleep(CHECKPOINT_EVERY_SECONDS)
+                # workers share DATA_DIR, so only the leader writes the checkpoint
+                if LEADER.held:
+                    await asyncio.to_thread(_checkpoint_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[checkpoint] error: {e}")
+
+    _checkpoint_task = asyncio.create_task(_loop())
+
+@app.on_event("shutdown")
+async def _stop_background():
+    for task in (_generator_task, _compaction_task, _boot_task, _checkpoint_task):
+        if task is not None:
+            task.cancel()
+    if WATCH_DATA_DIR:
+        await asyncio.to_thread(WATCHER.stop)
+    if CHECKPOINT_EVERY_SECONDS > 0 and LEADER.held:
+        try:
+            await asyncio.to_thread(_checkpoint_once)
+        except Exception as e:
+            print(f"[checkpoint] error: {e}")
+    LEADER.release()
+
+async def _require_store() -> None:
+    # until the boot load is in, the store is empty: a 200 would read as an empty collection
+    if STORE.managed and not STORE.ready:
+        raise HTTPException(status_code=503, detail="Store is still loading", headers={"Retry-After": "1"})
 
 @app.get("/healthz")
 def healthz():
-    return {
-        "status": "ok", 
+    # 503 until the store has loaded, so orchestrators hold traffic back from a booting worker
+    return JSONResponse(status_code=200 if STORE.ready else 503, content={
+        "status": "ok" if STORE.ready else "starting",
+        "Ready": STORE.ready,
+        "Objects": len(STORE),
+        "Generation": STORE.generation,
         "Host": HOST,
         "Port": PORT,
+        "Leader": LEADER.held,
         "Greeting": "Hello, friend.",
-        "API_KEYS": API_KEYS,
         "SourceSystem": SOURCE_SYSTEM, 
         "Version": API_VERSION, 
         "Timestamp": datetime.now(timezone.utc).isoformat(),
@@ -119,28 +417,44 @@ def healthz():
         "GenAI-Model-Status": "online", 
         "PowerSource": "Nuclear",
         "Transport": "Quantum"
-    }
+    })
 
-@app.get("/api/v1/indicators", dependencies=[Depends(require_api_key)])
+@app.get("/metrics")
+def metrics():
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/v1/indicators", dependencies=[Depends(require_api_key), Depends(_require_store)])
 def get_indicators(
+    request: Request,
     since: Optional[str] = Query(None, description="RFC3339 UTC, e.g., 2025-08-10T00:00:00Z"),
+    added_before: Optional[str] = Query(None, description="RFC3339 UTC; only objects strictly older than it"),
     limit: Optional[int] = Query(None, ge=1, le=1000, description="Deprecated in favor of page_size"),
     page_size: Optional[int] = Query(None, ge=1, le=1000),
     next: Optional[str] = Query(None, description="Opaque paging token from previous response"),
+    stream: Optional[str] = Query(None, pattern=_STREAM_PATTERN, description="Stream every match as NDJSON or a chunked bundle; implied when page_size and limit are omitted"),
 ):
-    items = load_indicators(DATA_DIR, since=since, limit=10_000)["stixobjects"]
+    validators, early = _preflight(request)
+    if early is not None:
+        return early
     if page_size is None:
-        page_size = limit or len(items)
-    offset = decode_token(next)
-    page, total, more, next_token = _page(items, offset, page_size)
-    return JSONResponse(content={
+        page_size = limit
+    if stream or (page_size is None and not next):
+        return _stream(request, stream or "bundle", since, ["indicator"], lambda total: {
+            "count": total,
+            "total": total,
+            "more": False,
+            "next": None,
+            "sourcesystem": SOURCE_SYSTEM,
+        }, "stixobjects", headers=validators, filters={"until": added_before})
+    page, total, more, next_token = _page(request, since, ["indicator"], page_size, next, until=added_before)
+    return _send(request, {
         "count": len(page),
         "total": total,
         "more": more,
         "next": next_token,
         "sourcesystem": SOURCE_SYSTEM,
         "stixobjects": page
-    })
+    }, "stixobjects", page, "application/json", validators)
 
 @app.get("/api/v1/collections", dependencies=[Depends(require_api_key)])
 def list_collections():
@@ -152,28 +466,177 @@ def list_collections():
         "can_write": False
     }]}
 
-@app.get("/api/v1/collections/{collection_id}/objects", dependencies=[Depends(require_api_key)])
+@app.get("/api/v1/collections/{collection_id}/objects", dependencies=[Depends(require_api_key), Depends(_require_store)])
 def get_collection_objects(
+    request: Request,
     collection_id: str,
     since: Optional[str] = Query(None, description="RFC3339 UTC, e.g., 2025-08-10T00:00:00Z"),
+    added_before: Optional[str] = Query(None, description="RFC3339 UTC; only objects strictly older than it"),
     types: Optional[str] = Query(None, description="Comma-separated STIX types, e.g., indicator,attack-pattern"),
     page_size: int = Query(100, ge=1, le=1000),
     next: Optional[str] = Query(None),
+    stream: Optional[str] = Query(None, pattern=_STREAM_PATTERN, description="Stream every match as NDJSON or a chunked bundle instead of paging"),
 ):
     if collection_id != COLLECTION_ID:
         raise HTTPException(status_code=404, detail="Collection not found")
     type_list = _parse_types_param(types)
-    items = _collect_items(since, types=type_list)
-    offset = decode_token(next)
-    page, total, more, next_token = _page(items, offset, page_size)
-    return {
+    validators, early = _preflight(request)
+    if early is not None:
+        return early
+    if stream:
+        return _stream(request, stream, since, type_list, lambda total: {
+            "sourcesystem": SOURCE_SYSTEM,
+            "total": total,
+            "more": False,
+            "next": None,
+        }, "objects", headers=validators, filters={"until": added_before})
+    page, total, more, next_token = _page(request, since, type_list, page_size, next, until=added_before)
+    return _send(request, {
         "objects": page,
         "sourcesystem": SOURCE_SYSTEM,
         "total": total,
         "more": more,
         "next": next_token
+    }, "objects", page, "application/json", validators)
+
+def _ioc_pairs(value: str, ioc_type: Optional[str]) -> List[tuple]:
+    # without a type the value is probed under every type: still a fixed number of hash lookups
+    if ioc_type is None:
+        return [(t, normalize(t, value)) for t in IOC_TYPES]
+    if ioc_type not in IOC_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown IOC type; expected one of {', '.join(IOC_TYPES)}")
+    return [(ioc_type, normalize(ioc_type, value))]
+
+@app.get("/api/v1/iocs/lookup", dependencies=[Depends(require_api_key), Depends(_require_store)])
+def lookup_ioc(
+    value: str = Query(..., min_length=1, description="IP, domain, URL, email or file hash"),
+    type: Optional[str] = Query(None, description=f"One of {', '.join(IOC_TYPES)}; probes all when omitted"),
+):
+    pairs = _ioc_pairs(value, type)
+    matches = [{"type": kind, "value": normalized, "indicators": found}
+               for (kind, normalized), found in zip(pairs, STORE.lookup(pairs)) if found]
+    return Response(content=dumps({"value": value, "found": bool(matches), "matches": matches}), media_type="application/json")
+
+class IocBatch(BaseModel):
+    values: List[str]
+    type: Optional[str] = None
+    include_objects: bool = False
+
+@app.post("/api/v1/iocs/lookup", dependencies=[Depends(require_api_key), Depends(_require_store)])
+def lookup_iocs(batch: IocBatch):
+    if len(batch.values) > IOC_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {IOC_BATCH_MAX} values per request")
+    pairs: List[tuple] = []
+    owners: List[int] = []
+    for n, value in enumerate(batch.values):
+        for pair in _ioc_pairs(value, batch.type):
+            pairs.append(pair)
+            owners.append(n)
+    found = STORE.lookup(pairs, objects=batch.include_objects)
+    results: List[Dict[str, Any]] = []
+    matched = set()
+    for n, (kind, _), hits in zip(owners, pairs, found):
+        if hits:
+            matched.add(n)
+            results.append({"value": batch.values[n], "type": kind, ("indicators" if batch.include_objects else "ids"): hits})
+    return Response(content=dumps({"count": len(batch.values), "matched": len(matched), "results": results}),
+                    media_type="application/json")
+
+@app.get("/api/v1/objects/{object_id}/neighborhood", dependencies=[Depends(require_api_key), Depends(_require_store)])
+def get_neighborhood(
+    object_id: str,
+    depth: int = Query(1, ge=1, le=4, description="Relationship hops to follow"),
+    relationship_types: Optional[str] = Query(None, description="Comma-separated, e.g., indicates,attributed-to"),
+    direction: str = Query("both", pattern="^(out|in|both)$", description="out follows source_ref -> target_ref"),
+    limit: int = Query(1000, ge=1, le=10000, description="Most neighbours returned"),
+):
+    hood = STORE.neighborhood(object_id, depth=depth, rel_types=_parse_types_param(relationship_types),
+                              direction=direction, limit=limit)
+    if hood is None:
+        raise HTTPException(status_code=404, detail="Object not found")
+    hood["depth"] = depth
+    hood["sourcesystem"] = SOURCE_SYSTEM
+    return Response(content=dumps(hood), media_type="application/json")
+
+@app.get("/api/v1/actors/{actor}/indicators", dependencies=[Depends(require_api_key), Depends(_require_store)])
+def get_actor_indicators(
+    actor: str,
+    limit: Optional[int] = Query(None, ge=1, le=100000),
+):
+    found = STORE.attributed(actor, limit=limit, raw=True)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Actor not found")
+    return Response(content=assemble({
+        "actor": actor,
+        "count": len(found),
+        "sourcesystem": SOURCE_SYSTEM,
+        "indicators": found,
+    }, "indicators", found), media_type="application/json")
+
+async def _changes_after(since: int, types: Optional[List[str]], limit: int, wait: float) -> Dict[str, Any]:
+    # STORE.changes may refresh (and so parse), which stays off the event loop
+    generation, complete, changes = await asyncio.to_thread(STORE.changes, since, limit)
+    deadline = time.monotonic() + wait
+    while complete and not changes and time.monotonic() < deadline:
+        # without the watcher nothing builds unless asked: re-check every refresh interval
+        timeout = deadline - time.monotonic() if STORE.managed else min(deadline - time.monotonic(), STORE_REFRESH_SECONDS)
+        await NOTIFIER.wait(max(timeout, 0.0))
+        generation, complete, changes = await asyncio.to_thread(STORE.changes, since, limit)
+    return {
+        "generation": generation,
+        "since_generation": since,
+        "complete": complete,
+        "more": generation < STORE.generation,
+        "changes": delta(changes, types),
     }
 
+@app.get("/api/v1/changes", dependencies=[Depends(require_api_key), Depends(_require_store)])
+async def get_changes(
+    since_generation: Optional[int] = Query(None, ge=0, description="Last generation seen; omit to get the current one"),
+    types: Optional[str] = Query(None, description="Comma-separated STIX types to report"),
+    limit: int = Query(10000, ge=1, le=100000, description="Ids per response; whole generations are kept together"),
+    wait: float = Query(0, ge=0, description=f"Hold the request up to this many seconds (max {CHANGES_WAIT_MAX_SECONDS:g}) until something changes"),
+):
+    if since_generation is None:
+        generation = (await asyncio.to_thread(STORE.changes, None))[0]
+        body = {"generation": generation, "since_generation": None, "complete": True, "more": False, "changes": []}
+    else:
+        body = await _changes_after(since_generation, _parse_types_param(types), limit, min(wait, CHANGES_WAIT_MAX_SECONDS))
+    return Response(content=dumps(body), media_type="application/json", headers={"Cache-Control": "no-store"})
+
+@app.get("/api/v1/changes/stream", dependencies=[Depends(require_api_key), Depends(_require_store)])
+async def stream_changes(
+    request: Request,
+    since_generation: Optional[int] = Query(None, ge=0, description="Replay changes after this generation first"),
+    types: Optional[str] = Query(None, description="Comma-separated STIX types to report"),
+):
+    type_list = _parse_types_param(types)
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        # a reconnecting EventSource resumes where it left off
+        since_generation = int(last_event_id)
+
+    async def _events():
+        since = since_generation
+        if since is None:
+            since = (await asyncio.to_thread(STORE.changes, None))[0]
+        yield b"retry: 3000\n" + sse_message({"generation": since}, event="hello", id=since)
+        while not await request.is_disconnected():
+            body = await _changes_after(since, type_list, 10000, CHANGES_HEARTBEAT_SECONDS)
+            if not body["complete"]:
+                # too far behind (or from before a restart): the consumer has to re-read everything
+                since = body["generation"]
+                yield sse_message({"generation": since}, event="reset", id=since)
+                continue
+            for change in body["changes"]:
+                yield sse_message(change, event="change", id=change["generation"])
+            if body["generation"] == since:
+                yield b": keepalive\n\n"
+            since = body["generation"]
+
+    return StreamingResponse(_events(), media_type=SSE_MEDIA_TYPE,
+                             headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
 @app.get("/taxii2/", summary="TAXII Discovery", dependencies=[Depends(require_api_key)])
 def taxii_discovery(request: Request):
     base = str(request.base_url).rstrip("/")
@@ -198,62 +661,125 @@ def taxii_collections():
         }]
     }, media_type="application/taxii+json")
 
-@app.get("/taxii2/root/collections/{collection_id}/objects", summary="TAXII Objects", dependencies=[Depends(require_api_key)])
+STIX_MEDIA_TYPE = "application/stix+json;version=2.1"
+
+def _taxii_filters(collection_id: str, types: Optional[str], added_before: Optional[str], match_id: Optional[str],
+                   match_version: Optional[str]):
+    """(type list, ObjectStore.page/scan filters) for the TAXII match[...] / added_before parameters."""
+    if collection_id != COLLECTION_ID:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    type_list = [ "indicator" ] if os.getenv("TAXII_INDICATORS_ONLY", "false").lower() == "true" else _parse_types_param(types)
+    filters: Dict[str, Any] = {}
+    if added_before:
+        filters["until"] = added_before
+    ids = _parse_types_param(match_id)
+    if ids:
+        filters["ids"] = ids
+    versions = _parse_types_param(match_version) or []
+    # one version is kept per id, so first, last and all all select it
+    stamps = [v for v in versions if v not in ("first", "last", "all")]
+    if any(not is_ts(v) for v in stamps):
+        raise HTTPException(status_code=400, detail="match[version] takes first, last, all or RFC 3339 timestamps")
+    if stamps:
+        filters["versions"] = [parse_ts(v) for v in stamps]
+    return type_list, filters
+
+def _manifest_entry(meta) -> Dict[str, Any]:
+    oid, added, version, _ = meta
+    return {"id": oid, "date_added": key_iso(added), "version": key_iso(version), "media_type": STIX_MEDIA_TYPE}
+
+@app.get("/taxii2/root/collections/{collection_id}/manifest", summary="TAXII Manifest", dependencies=[Depends(require_api_key), Depends(_require_store)])
+def taxii_manifest(
+    request: Request,
+    collection_id: str,
+    added_after: Optional[str] = Query(None, description="RFC3339 timestamp; filters by valid_from/created"),
+    added_before: Optional[str] = Query(None, description="RFC3339 timestamp; only objects added before it"),
+    limit: int = Query(100, ge=1, le=10000),
+    next: Optional[str] = Query(None, description="Opaque paging token"),
+    match_id: Optional[str] = Query(None, alias="match[id]", description="Comma-separated object ids"),
+    match_type: Optional[str] = Query(None, alias="match[type]", description="Comma-separated STIX types"),
+    match_version: Optional[str] = Query(None, alias="match[version]", description="last, first, all or comma-separated timestamps"),
+):
+    type_list, filters = _taxii_filters(collection_id, match_type, added_before, match_id, match_version)
+    validators, early = _preflight(request, f"types={','.join(type_list) if type_list else 'all'}")
+    if early is not None:
+        # a cached body replays the date headers it was sent with; a 304 has no page, so it carries none
+        return early
+    # served from the metadata index alone: no object body is read or serialized
+    metas, _, after = STORE.page(since=added_after, types=type_list, size=limit, meta=True, **filters, **decode_token(next))
+    if metas:
+        validators = dict(validators, **{"X-TAXII-Date-Added-First": key_iso(metas[0][1]),
+                                         "X-TAXII-Date-Added-Last": key_iso(metas[-1][1])})
+    entries = [dumps(_manifest_entry(m)) for m in metas]
+    return _send(request, {
+        "more": after is not None,
+        "next": encode_token(*after) if after else None,
+        "objects": entries,
+    }, "objects", entries, "application/taxii+json", validators)
+
+@app.get("/taxii2/root/collections/{collection_id}/objects/{object_id}", summary="TAXII Object", dependencies=[Depends(require_api_key), Depends(_require_store)])
+def taxii_object(
+    request: Request,
+    collection_id: str,
+    object_id: str,
+    match_version: Optional[str] = Query(None, alias="match[version]", description="last, first, all or comma-separated timestamps"),
+):
+    type_list, filters = _taxii_filters(collection_id, None, None, object_id, match_version)
+    validators, early = _preflight(request)
+    if early is not None:
+        return early
+    page, _, _ = STORE.page(types=type_list, raw=True, **filters)
+    if not page:
+        raise HTTPException(status_code=404, detail="Object not found")
+    return _send(request, {"more": False, "objects": page}, "objects", page, "application/taxii+json", validators)
+
+@app.get("/taxii2/root/collections/{collection_id}/objects/{object_id}/versions", summary="TAXII Object Versions", dependencies=[Depends(require_api_key), Depends(_require_store)])
+def taxii_object_versions(
+    request: Request,
+    collection_id: str,
+    object_id: str,
+    added_after: Optional[str] = Query(None, description="RFC3339 timestamp; filters by valid_from/created"),
+):
+    type_list, filters = _taxii_filters(collection_id, None, None, object_id, None)
+    metas, _, _ = STORE.page(since=added_after, types=type_list, meta=True, **filters)
+    if not metas and STORE.meta(object_id) is None:
+        raise HTTPException(status_code=404, detail="Object not found")
+    headers = {}
+    if metas:
+        headers = {"X-TAXII-Date-Added-First": key_iso(metas[0][1]), "X-TAXII-Date-Added-Last": key_iso(metas[-1][1])}
+    return Response(content=dumps({"more": False, "versions": [key_iso(m[2]) for m in metas]}),
+                    media_type="application/taxii+json", headers=headers)
+
+@app.get("/taxii2/root/collections/{collection_id}/objects", summary="TAXII Objects", dependencies=[Depends(require_api_key), Depends(_require_store)])
 def taxii_objects(
     request: Request,
     collection_id: str,
     added_after: Optional[str] = Query(None, description="RFC3339 timestamp; filters by valid_from/created"),
+    added_before: Optional[str] = Query(None, description="RFC3339 timestamp; only objects added before it"),
     limit: int = Query(100, ge=1, le=1000),
     next: Optional[str] = Query(None, description="Opaque paging token"),
     types: Optional[str] = Query(None, description="Comma-separated STIX types, e.g., indicator,attack-pattern"),
+    match_id: Optional[str] = Query(None, alias="match[id]", description="Comma-separated object ids"),
+    match_type: Optional[str] = Query(None, alias="match[type]", description="Comma-separated STIX types"),
+    match_version: Optional[str] = Query(None, alias="match[version]", description="last, first, all or comma-separated timestamps"),
+    stream: Optional[str] = Query(None, pattern=_STREAM_PATTERN, description="Stream every match as NDJSON or a chunked bundle instead of paging"),
 ):
-    if collection_id != COLLECTION_ID:
-        raise HTTPException(status_code=404, detail="Collection not found")
-    type_list = [ "indicator" ] if os.getenv("TAXII_INDICATORS_ONLY", "false").lower() == "true" else _parse_types_param(types)
-    items = _collect_items(added_after, types=type_list)
-    offset = decode_token(next)
-    page, total, more, next_token = _page(items, offset, limit)
-
-    def _max_ts(items):
-        if not items:
-            return datetime(1970,1,1,tzinfo=timezone.utc)
-        vals = []
-        for o in items:
-            ts = o.get("valid_from") or o.get("created") or "1970-01-01T00:00:00Z"
-            try:
-                vals.append(datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc))
-            except ValueError:
-                try:
-                    vals.append(datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc))
-                except ValueError:
-                    vals.append(datetime(1970,1,1,tzinfo=timezone.utc))
-        return max(vals)
-
-    last_modified = _max_ts(items)
-    extras = f"types={','.join(type_list) if type_list else 'all'};total={total}"
-    import hashlib
-    etag = f'W/"{hashlib.sha256((last_modified.isoformat() + "|" + str(len(items)) + "|" + extras).encode()).hexdigest()[:16]}"'
-    last_modified_http = last_modified.astimezone(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S GMT")
+    type_list, filters = _taxii_filters(collection_id, match_type or types, added_before, match_id, match_version)
+    validators, early = _preflight(request, f"types={','.join(type_list) if type_list else 'all'}")
+    if early is not None:
+        return early
 
-    inm = request.headers.get("if-none-match")
-    ims = request.headers.get("if-modified-since")
-    if inm and inm == etag:
-        return Response(status_code=304, headers={"ETag": etag, "Last-Modified": last_modified_http})
-    if ims:
-        try:
-            ims_dt = datetime.strptime(ims, "%a, %d %b %Y %H:%M:%S GMT").replace(tzinfo=timezone.utc)
-            if last_modified <= ims_dt:
-                return Response(status_code=304, headers={"ETag": etag, "Last-Modified": last_modified_http})
-        except Exception:
-            pass
-
-    return JSONResponse(
-        content={
-            "objects": page,
+    if stream:
+        return _stream(request, stream, added_after, type_list, lambda total: {
             "sourcesystem": SOURCE_SYSTEM,
-            "more": more,
-            "next": next_token
-        },
-        media_type="application/taxii+json",
-        headers={"ETag": etag, "Last-Modified": last_modified_http}
-    )
+            "more": False,
+            "next": None,
+        }, "objects", media_type="application/taxii+json", headers=validators, filters=filters)
+
+    page, total, more, next_token = _page(request, added_after, type_list, limit, next, **filters)
+    return _send(request, {
+        "objects": page,
+        "sourcesystem": SOURCE_SYSTEM,
+        "more": more,
+        "next": next_token
+    }, "objects", page, "application/taxii+json", validators)
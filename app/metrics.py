@@ -0,0 +1,175 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Deliberately small: label values are passed positionally, each family guards its
+children with one lock, and a histogram observation is a bisect plus two adds, so
+the instrumentation stays on under full load. Values that already live elsewhere
+(object count, cache counters) are read through callbacks at scrape time.
+"""
+import threading, time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+class _Scalar(_Family):
+    """One number per label set, kept here or read from `fn` (a number, or {labels: number}) at scrape time."""
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = (), fn: Optional[Callable] = None):
+        super().__init__(name, doc, labelnames)
+        self.fn = fn
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def render(self) -> List[str]:
+        if self.fn is not None:
+            got = self.fn()
+            items = sorted(got.items()) if isinstance(got, dict) else [((), got)]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+class Counter(_Scalar):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(_Scalar):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(buckets)
+        # per label set: [count per bucket (+Inf last)], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(labels)
+            if child is None:
+                child = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            child[0][i] += 1
+            child[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        out = self._header()
+        for key, (counts, total) in items:
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = 'le="%s"' % _num(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {running}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self._families: List[_Family] = []
+
+    def register(self, family: _Family) -> _Family:
+        self._families.append(family)
+        return family
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self._families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last body byte sent.", ("route", "method", "status")))
+REQUEST_BYTES = REGISTRY.register(Counter(
+    "http_request_size_bytes_total", "Request body bytes received (Content-Length).", ("route", "method")))
+RESPONSE_BYTES = REGISTRY.register(Counter(
+    "http_response_size_bytes_total", "Response body bytes sent, after compression.", ("route", "method")))
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    "request_phase_duration_seconds",
+    "Time spent per request phase: scan_parse (store refresh), filter, paging, serialize, compress.", ("route", "phase")))
+GENERATOR_SECONDS = REGISTRY.register(Histogram(
+    "generator_run_duration_seconds", "Wall time of one snapshot generation, including the write and ingest.",
+    buckets=SLOW_BUCKETS))
+GENERATOR_OBJECTS = REGISTRY.register(Counter(
+    "generator_objects_total", "Objects written by the generator."))
+GENERATOR_LAST_OBJECTS = REGISTRY.register(Gauge(
+    "generator_last_run_objects", "Objects written by the most recent generator run."))
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no per-request task or body buffering) feeding the request families."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        state = [500, 0]
+
+        async def _send(message):
+            kind = message["type"]
+            if kind == "http.response.start":
+                state[0] = message["status"]
+            elif kind == "http.response.body":
+                state[1] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = scope.get("route")
+            # the route template, not the raw path, so ids and tokens don't explode the label space
+            name = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            REQUEST_SECONDS.observe(time.perf_counter() - started, name, method, str(state[0]))
+            RESPONSE_BYTES.inc(state[1], name, method)
+            for key, value in scope.get("headers", ()):
+                if key == b"content-length":
+                    try:
+                        REQUEST_BYTES.inc(int(value), name, method)
+                    except ValueError:
+                        pass
+                    break
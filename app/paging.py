@@ -1,18 +1,25 @@
 import base64, json
-from typing import Optional
+from typing import Optional, Dict, Any
 
-def encode_token(offset: int) -> str:
-    payload = {"o": int(offset)}
+def encode_token(ts: int, oid: str, generation: int) -> str:
+    payload = {"t": int(ts), "i": oid, "g": int(generation)}
     data = json.dumps(payload, separators=(",", ":")).encode("utf-8")
     return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
 
-def decode_token(token: Optional[str]) -> int:
+def decode_token(token: Optional[str]) -> Dict[str, Any]:
+    """Decode a paging token into keyword arguments for ObjectStore.page.
+
+    Offset tokens ({"o": n}) issued before keyset paging are still honoured.
+    Anything unreadable restarts from the first page, as before.
+    """
     if not token:
-        return 0
+        return {}
     try:
         pad = "=" * (-len(token) % 4)
         data = base64.urlsafe_b64decode(token + pad)
         payload = json.loads(data.decode("utf-8"))
-        return int(payload.get("o", 0))
+        if "i" in payload:
+            return {"after": (int(payload["t"]), str(payload["i"])), "as_of": int(payload.get("g", 0)) or None}
+        return {"skip": max(int(payload.get("o", 0)), 0)}
     except Exception:
-        return 0
+        return {}
@@ -0,0 +1,46 @@
+"""Single-flight, byte-bounded LRU for computed query pages.
+
+Callers build keys from the normalized query plus the identity of the store build
+the page is computed from, so a new build can never be answered from an older
+one's results; the app also clears the cache on each build to hand the memory back
+straight away. Identical queries that arrive while one is being computed wait for
+it instead of repeating the work.
+"""
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+from .lru import ByteLRU
+
+class QueryCache(ByteLRU):
+    def __init__(self, max_bytes: int):
+        super().__init__(max_bytes)
+        self._inflight: Dict[Hashable, Future] = {}
+        self.coalesced = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], size: Callable[[Any], int]) -> Any:
+        """The cached value for `key`, else compute() once however many callers ask at the same time."""
+        leader = False
+        with self._lock:
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+            else:
+                value = self._get(key)
+                if value is not None:
+                    return value
+                flight = self._inflight[key] = Future()
+                leader = True
+        if not leader:
+            return flight.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.set_exception(e)
+            raise
+        nbytes = size(value)
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._put(key, value, nbytes)
+        flight.set_result(value)
+        return value
@@ -0,0 +1,146 @@
+"""NDJSON segments with a sidecar offset index.
+
+A segment is `<name>.ndjson` (one compact STIX object per line) plus `<name>.idx`,
+a compact JSON document listing (id, type, sort ts, byte offset, length, version ts,
+generation) for every line. The generation is 0 except in segments written by
+compaction, where it keeps the build each object was first served in. Readers memory-map the segment and slice out only the objects they return;
+the index alone is enough to merge, filter and sort.
+"""
+import mmap, os
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from .file_store import obj_ts, obj_version
+from .serialize import dumps, loads
+
+SEGMENT_EXT = ".ndjson"
+INDEX_EXT = ".idx"
+INDEX_VERSION = 3
+
+# (id, type, sort ts, offset, length, version ts, generation); v1 indexes lacked the version and are
+# rebuilt on read, v2 ones lacked the generation and are read with 0
+IndexEntry = Tuple[str, str, int, int, int, int, int]
+
+def index_path(segment_path: str) -> str:
+    return segment_path[: -len(SEGMENT_EXT)] + INDEX_EXT
+
+def _write_file(path: str, chunks: Iterable[bytes]) -> int:
+    with open(path, "wb", buffering=1 << 20) as fh:
+        for chunk in chunks:
+            fh.write(chunk)
+        size = fh.tell()
+        fh.flush()
+        os.fsync(fh.fileno())
+    return size
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def write_index(segment_path: str, size: int, entries: List[IndexEntry]) -> str:
+    """Atomically write the sidecar index for a segment of `size` bytes."""
+    idx_path = index_path(segment_path)
+    idx_tmp = os.path.join(os.path.dirname(idx_path), f".{os.path.basename(idx_path)}.tmp")
+    try:
+        _write_file(idx_tmp, [dumps({"v": INDEX_VERSION, "size": size, "entries": entries})])
+        os.replace(idx_tmp, idx_path)
+    except BaseException:
+        _remove_quietly(idx_tmp)
+        raise
+    return idx_path
+
+def index_entry(obj: Dict[str, Any], off: int, length: int) -> IndexEntry:
+    return (obj["id"], obj.get("type", ""), obj_ts(obj), off, length, obj_version(obj), 0)
+
+def write_segment(output_dir: str, name: str, objects: Iterable[Dict[str, Any]]) -> str:
+    """Write `objects` as segment `name` and return the .ndjson path."""
+    def _rows():
+        for obj in objects:
+            if not isinstance(obj, dict) or not obj.get("id"):
+                continue
+            raw = dumps(obj)
+            if obj.get("spec_version") == "2.1":
+                yield obj["id"], obj.get("type", ""), obj_ts(obj), obj_version(obj), raw, 0
+            else:
+                # kept on disk like any snapshot content, but never indexed
+                yield None, None, None, None, raw, 0
+    return write_rows(output_dir, name, _rows())
+
+def write_rows(output_dir: str, name: str,
+               rows: Iterable[Tuple[Optional[str], Optional[str], Optional[int], Optional[int], bytes, int]]) -> str:
+    """Write already-serialized (id, type, sort ts, version ts, raw, generation) rows as segment `name`; rows with id None are not indexed.
+
+    The index is renamed into place before the segment, so any reader that
+    sees the .ndjson also finds a complete index for it.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    seg_path = os.path.join(output_dir, name + SEGMENT_EXT)
+    seg_tmp = os.path.join(output_dir, f".{name}{SEGMENT_EXT}.tmp")
+    entries: List[IndexEntry] = []
+
+    def _lines():
+        off = 0
+        for oid, otype, ts, ver, raw, gen in rows:
+            if oid is not None:
+                entries.append((oid, otype, ts, off, len(raw), ver, gen))
+            off += len(raw) + 1
+            yield raw + b"\n"
+
+    try:
+        size = _write_file(seg_tmp, _lines())
+        write_index(seg_path, size, entries)
+        os.replace(seg_tmp, seg_path)
+    except BaseException:
+        _remove_quietly(seg_tmp)
+        raise
+    return seg_path
+
+class Segment:
+    """A memory-mapped segment. The mapping stays valid after the file is unlinked."""
+    __slots__ = ("path", "size", "_mm", "__weakref__")
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self.size = os.fstat(fh.fileno()).st_size
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+    def read(self, off: int, length: int) -> bytes:
+        return self._mm[off:off + length]
+
+    def entries(self) -> List[IndexEntry]:
+        """Index entries from the sidecar, or rebuilt from the lines if it is missing or stale."""
+        try:
+            with open(index_path(self.path), "rb") as fh:
+                idx = loads(fh.read())
+            if idx.get("size") == self.size:
+                if idx.get("v") == INDEX_VERSION:
+                    return [tuple(e) for e in idx["entries"]]
+                if idx.get("v") == 2:
+                    return [(*e, 0) for e in idx["entries"]]
+        except (OSError, ValueError):
+            pass
+        return self._scan_entries()
+
+    def _scan_entries(self) -> List[IndexEntry]:
+        out: List[IndexEntry] = []
+        mm = self._mm
+        if mm is None:
+            return out
+        off = 0
+        while off < self.size:
+            end = mm.find(b"\n", off)
+            if end < 0:
+                end = self.size
+            line = mm[off:end].strip()
+            if line:
+                try:
+                    obj = loads(line)
+                except ValueError:
+                    obj = None
+                if isinstance(obj, dict) and obj.get("id") and obj.get("spec_version") == "2.1":
+                    # offsets point at the stripped line so reads return exactly the object
+                    lead = len(mm[off:end]) - len(mm[off:end].lstrip())
+                    out.append(index_entry(obj, off + lead, len(line)))
+            off = end + 1
+        return out
@@ -0,0 +1,28 @@
+import json
+from typing import Dict, Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, byte-for-byte what JSONResponse would render."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def assemble(envelope: Dict[str, Any], key: str, raws: Iterable[bytes]) -> bytes:
+    """Render `envelope` with `key` spliced in as a JSON array of pre-serialized objects."""
+    parts = []
+    for k, v in envelope.items():
+        if k == key:
+            parts.append(dumps(k) + b":[" + b",".join(raws) + b"]")
+        else:
+            parts.append(dumps(k) + b":" + dumps(v))
+    return b"{" + b",".join(parts) + b"}"
@@ -0,0 +1,830 @@
+import json, os, threading, time, hashlib
+from array import array
+from heapq import merge
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Optional, Iterable, Sequence, Tuple, Union, Callable
+from .file_store import obj_ts, obj_version, parse_ts
+from .serialize import dumps, loads
+from .segments import SEGMENT_EXT, Segment
+from .ioc import parse_pattern
+from .checkpoint import read_checkpoint, write_checkpoint
+from .interning import Interner, Packed, intern, materialize
+from .generations import SharedGenerations
+
+# An object's bytes: held in memory for JSON snapshots (packed, see app.interning), or
+# (segment, offset, length) for mmap'd segments and checkpoints.
+Raw = Union[bytes, Packed, Tuple[Segment, int, int]]
+# (id, type, sort ts, version ts, raw, generation first served in or 0 for the file's own)
+Entry = Tuple[str, str, int, int, Raw, int]
+Key = Tuple[int, str]
+# (id, ioc type, normalized value)
+IocRow = Tuple[str, str, str]
+# (relationship id, relationship_type, source_ref, target_ref)
+RelRow = Tuple[str, str, str, str]
+# (relationship_type, relationship key, neighbour key, "out" | "in")
+Edge = Tuple[str, Key, Key, str]
+# one object in a build: (key, type, version ts, raw, generation)
+Row = Tuple[Key, str, int, Raw, int]
+# (generation, ids added or re-versioned by it, ids it removed)
+Change = Tuple[int, Tuple[str, ...], Tuple[str, ...]]
+
+def _read_snapshot(path: str, interner: Optional[Interner] = None) -> List[Entry]:
+    with open(path, "r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    out: List[Entry] = []
+    for obj in payload.get("stixobjects", []):
+        if not isinstance(obj, dict):
+            continue
+        if obj.get("spec_version") != "2.1":
+            continue
+        if not obj.get("id"):
+            continue
+        # objects never change once on disk, so encode them once here rather than per response
+        raw = interner.pack(obj) if interner is not None else dumps(obj)
+        out.append((obj["id"], intern(obj.get("type", "")), obj_ts(obj), obj_version(obj), raw, 0))
+    return out
+
+def _read_segment(path: str) -> List[Entry]:
+    seg = Segment(path)
+    return [(oid, intern(otype), ts, ver, (seg, off, ln), gen) for oid, otype, ts, off, ln, ver, gen in seg.entries()]
+
+def _read_file(path: str, interner: Optional[Interner] = None) -> List[Entry]:
+    if path.endswith(SEGMENT_EXT):
+        return _read_segment(path)
+    return _read_snapshot(path, interner)
+
+_LINKED_TYPES = frozenset(("indicator", "relationship", "identity"))
+
+def _read_links(entries: List[Entry]) -> Tuple[List[IocRow], List[RelRow], List[Tuple[str, str]]]:
+    """Indicator observables, relationship endpoints and identity names: the only bodies parsed at ingest."""
+    iocs: List[IocRow] = []
+    rels: List[RelRow] = []
+    names: List[Tuple[str, str]] = []
+    for oid, otype, _, _, raw, _ in entries:
+        if otype not in _LINKED_TYPES:
+            continue
+        obj = loads(materialize(raw))
+        if otype == "indicator":
+            pattern = obj.get("pattern")
+            if isinstance(pattern, str):
+                iocs.extend((oid, kind, value) for kind, value in parse_pattern(pattern))
+        elif otype == "relationship":
+            src, tgt = obj.get("source_ref"), obj.get("target_ref")
+            if isinstance(src, str) and isinstance(tgt, str):
+                rels.append((oid, intern(obj.get("relationship_type", "")), src, tgt))
+        elif isinstance(obj.get("name"), str):
+            names.append((oid, obj["name"].strip().lower()))
+    return iocs, rels, names
+
+def _first_generation(carried: int, loaded: int) -> int:
+    # a generation carried over by compaction can't postdate the file it arrived in (counters restart with the process)
+    return min(carried, loaded) if carried and loaded else carried or loaded
+
+def _is_data_file(name: str) -> bool:
+    lower = name.lower()
+    return not lower.startswith(".") and (lower.endswith(".json") or lower.endswith(SEGMENT_EXT))
+
+def _spliced(column, at: List[int], values: list):
+    """A copy of `column` (list or array) with values[j] inserted before its item at[j]; `at` ascends."""
+    out = column[:0]
+    prev = 0
+    for i, value in zip(at, values):
+        out += column[prev:i]
+        out.append(value)
+        prev = i
+    out += column[prev:]
+    return out
+
+def _shifted(positions: array, at: List[int], mine: List[bool]) -> array:
+    """`positions` renumbered for rows inserted at `at` (see _spliced), plus those flagged in `mine`."""
+    out = array("q")
+    prev = 0
+    for j, i in enumerate(at):
+        # old positions before i move down by the j rows inserted ahead of them
+        cut = bisect_left(positions, i, prev)
+        out.extend(map(j.__add__, positions[prev:cut]) if j else positions[prev:cut])
+        prev = cut
+        if mine[j]:
+            out.append(i + j)
+    out.extend(map(len(at).__add__, positions[prev:]))
+    return out
+
+class _View:
+    """One published build of the store, held column-wise.
+
+    `keys` holds (-ts, id) ascending, i.e. newest first with ties broken by id,
+    so a (ts, id) cursor is resumed with a single bisect. `types`, `versions`
+    (modified), `raws` and `gens` are aligned with it; together they are the
+    metadata index, and object bodies are only touched for what a caller returns.
+    `fingerprint` and `last_modified` (epoch seconds) are the cache validators for
+    this build, fixed when it is published. `iocs` maps ioc type -> normalized value
+    -> keys of the indicators carrying it; `graph` maps an object id to the
+    relationships touching it (both directions), for traversal without a scan, and
+    `names` maps a lower-cased identity name to the keys of identities so named.
+    `by_type` lists, per type, the positions of its objects in ascending order, so a
+    type-filtered time window is a pair of bisects as well; it is derived from
+    `types` unless the caller already has it.
+    """
+    __slots__ = ("keys", "types", "versions", "raws", "gens", "generation", "fingerprint", "last_modified", "iocs", "graph",
+                 "names", "by_type", "_newer")
+
+    def __init__(self, keys: List[Key], types: List[str], versions: Sequence[int], raws: List[Raw], gens: Sequence[int],
+                 generation: int, fingerprint: str = "", last_modified: float = 0.0,
+                 iocs: Optional[Dict[str, Dict[str, List[Key]]]] = None, graph: Optional[Dict[str, List[Edge]]] = None,
+                 names: Optional[Dict[str, List[Key]]] = None, by_type: Optional[Dict[str, array]] = None):
+        self.keys = keys
+        self.types = types
+        self.versions = versions
+        self.raws = raws
+        self.gens = gens
+        self.generation = generation
+        self.fingerprint = fingerprint
+        self.last_modified = last_modified
+        self.iocs = iocs or {}
+        self.graph = graph or {}
+        self.names = names or {}
+        if by_type is None:
+            by_type = {}
+            for i, t in enumerate(types):
+                positions = by_type.get(t)
+                if positions is None:
+                    positions = by_type[t] = array("q")
+                positions.append(i)
+        self.by_type = by_type
+        self._newer: Dict[int, List[int]] = {}
+
+    def position(self, key: Key) -> int:
+        i = bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else -1
+
+    def newer(self, generation: int) -> List[int]:
+        """Positions of the objects first served after `generation`, ascending; kept for the few generations asked."""
+        found = self._newer.get(generation)
+        if found is None:
+            if len(self._newer) >= 8:
+                self._newer.clear()
+            found = self._newer[generation] = [i for i, g in enumerate(self.gens) if g > generation]
+        return found
+
+    def raw(self, i: int) -> bytes:
+        return materialize(self.raws[i])
+
+    def obj(self, i: int) -> Dict[str, Any]:
+        return loads(self.raw(i))
+
+class ObjectStore:
+    """Long-lived view of DATA_DIR: merged, deduped (first file wins) and sorted newest first.
+
+    Reads JSON snapshots and NDJSON segments (see app.segments). Only files whose
+    (mtime, size) changed since the last scan are re-read. Readers grab the current
+    _View once, so a refresh never disturbs a request in flight.
+
+    With a `marker` file, processes sharing DATA_DIR coordinate cheaply: it holds
+    their shared generation numbers (see app.generations), so a paging token or
+    change feed position from one worker means the same build in all of them, and
+    since every numbered change rewrites it, readers only walk the directory when it
+    moved (or every `rescan_interval` seconds, for files dropped in from outside).
+    Without one, generations count the builds of this process.
+
+    While something else keeps the store current (the boot load, then app.watcher),
+    `managed` is set and readers stop checking DATA_DIR themselves. `ready` turns
+    true once a full scan of DATA_DIR has been applied. save_checkpoint() and
+    warm_start() persist and restore the per-file index, so a restart only re-reads files
+    that changed since (see app.checkpoint).
+
+    Every build after the first logs which ids it added and removed (the last
+    `changelog_size` builds are kept), so changes() answers "what is new since
+    generation N" from the log alone; subscribe() callbacks fire on each build.
+    """
+
+    def __init__(self, data_dir: str, refresh_interval: float = 1.0, marker: Optional[str] = None, rescan_interval: float = 30.0,
+                 changelog_size: int = 1024):
+        self.data_dir = data_dir
+        self.refresh_interval = refresh_interval
+        self.marker = marker
+        self.shared = SharedGenerations(marker) if marker else None
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self.managed = False
+        self.ready = False
+        # monotonic() counts from boot, so 0.0 could still be "recent" on a young host
+        self._checked = float("-inf")
+        self._scanned = float("-inf")
+        self._marker_stat: Optional[Tuple[int, int, int]] = None
+        self._generation = 0
+        self._stats: Dict[str, Tuple[int, int]] = {}
+        self._file_entries: Dict[str, List[Entry]] = {}
+        self._file_links: Dict[str, Tuple[List[IocRow], List[RelRow], List[Tuple[str, str]]]] = {}
+        self._ioc_rows: List[Tuple[str, str, Key]] = []
+        self._rel_rows: List[Tuple[Key, str, str, str]] = []
+        self._name_rows: List[Tuple[str, Key]] = []
+        # relationships with an endpoint not loaded yet: an appended file may supply it
+        self._dangling: List[Tuple[Key, str, str, str]] = []
+        self._file_gen: Dict[str, int] = {}
+        # id -> key of the copy being served (the first file's)
+        self._keys: Dict[str, Key] = {}
+        self._last_modified = 0.0
+        self._view = _View([], [], [], [], [], 0)
+        self.changelog_size = changelog_size
+        # (oldest generation the log can answer from, changes oldest first), swapped whole
+        self._changelog: Tuple[int, Tuple[Change, ...]] = (0, ())
+        self._listeners: List[Callable[[int], None]] = []
+        # shared runs of JSON snapshot bodies; pruned when files go, bounded by its own cap
+        self._interner = Interner()
+
+    @property
+    def generation(self) -> int:
+        return self._view.generation
+
+    def current(self, generation: Optional[int] = None) -> _View:
+        """The build to answer from; one at least `generation` when another worker already has it."""
+        if generation is not None:
+            self._catch_up(generation)
+        self.refresh()
+        return self._view
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        found: Dict[str, Tuple[int, int]] = {}
+        for root, _, files in os.walk(self.data_dir):
+            for name in files:
+                if not _is_data_file(name):
+                    continue
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                found[full] = (st.st_mtime_ns, st.st_size)
+        return found
+
+    def refresh(self, force: bool = False) -> None:
+        if self.managed and not force:
+            return
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and now - self._checked < self.refresh_interval:
+                return
+            if not force and self.marker and not self._marker_moved() and now - self._scanned < self.rescan_interval:
+                self._checked = now
+                return
+            self._refresh_locked()
+            self._checked = self._scanned = time.monotonic()
+            self.ready = True
+
+    def warm_start(self, checkpoint: Optional[str] = None) -> int:
+        """A forced refresh that takes files unchanged since `checkpoint` from it instead of reading them.
+
+        Newer files are read and vanished ones dropped in the same single build.
+        Returns how many files came from the checkpoint.
+        """
+        saved = {p: (tuple(stat), entries, links) for p, stat, entries, links in read_checkpoint(checkpoint, self.data_dir)} \
+            if checkpoint else {}
+        with self._lock:
+            found = self._scan()
+            loaded = {p: (entries, links) for p, (stat, entries, links) in saved.items()
+                      if found.get(p) == stat and p not in self._stats}
+            self._refresh_locked(found, loaded)
+            self._checked = self._scanned = time.monotonic()
+            self.ready = True
+        return len(loaded)
+
+    def save_checkpoint(self, path: str) -> int:
+        """Write the per-file index to `path`; returns the generation it reflects."""
+        with self._lock:
+            # entry lists are replaced, never mutated, so these references stay consistent after the lock
+            files = [(p, self._stats[p], self._file_entries[p], self._file_links.get(p, ((), (), ())))
+                     for p in sorted(self._file_entries) if p in self._stats]
+            generation = self._generation
+        write_checkpoint(path, self.data_dir, files)
+        return generation
+
+    def file_generation(self, path: str, entry: Optional[Entry] = None) -> int:
+        """Generation `path` (or, with `entry`, that object in it) was first served in; 0 if not loaded."""
+        loaded = self._file_gen.get(path, 0)
+        return _first_generation(entry[5], loaded) if entry is not None else loaded
+
+    def pending(self) -> List[str]:
+        """Files added, changed or removed on disk since they were last loaded (a stat walk, nothing is read)."""
+        found = self._scan()
+        stats = dict(self._stats)
+        return [p for p in stats if p not in found] + [p for p, st in found.items() if stats.get(p) != st]
+
+    def _marker_moved(self) -> bool:
+        try:
+            st = os.stat(self.marker)
+            current = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            current = None
+        moved = current != self._marker_stat
+        self._marker_stat = current
+        return moved
+
+    def _catch_up(self, generation: int) -> None:
+        # a token from a worker that is ahead of this one: take in what it numbered before answering
+        if self.shared is None or generation <= self._view.generation:
+            return
+        with self._lock:
+            if generation > self._view.generation and self._marker_moved():
+                self._refresh_locked()
+                self._checked = self._scanned = time.monotonic()
+
+    def ingest(self, *paths: str) -> None:
+        """Pick up specific files right away (e.g. just written by the generator) without a directory scan."""
+        found: Dict[str, Tuple[int, int]] = {}
+        removed: List[str] = []
+        for p in paths:
+            try:
+                st = os.stat(p)
+            except OSError:
+                if p in self._stats:
+                    removed.append(p)
+                continue
+            found[p] = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            self._apply([p for p, st in found.items() if self._stats.get(p) != st], removed, found)
+
+    def _refresh_locked(self, found: Optional[Dict[str, Tuple[int, int]]] = None, loaded: Optional[Dict[str, tuple]] = None) -> None:
+        if found is None:
+            found = self._scan()
+        removed = [p for p in self._stats if p not in found]
+        changed = [p for p, st in found.items() if self._stats.get(p) != st]
+        self._apply(changed, removed, found, loaded)
+
+    def _load(self, p: str, stat: Tuple[int, int], loaded: Optional[Dict[str, tuple]] = None) -> bool:
+        if loaded and p in loaded:
+            self._file_entries[p], self._file_links[p] = loaded[p]
+        else:
+            try:
+                entries = _read_file(p, self._interner)
+                # patterns and refs are parsed once per file, here, never per lookup
+                self._file_links[p] = _read_links(entries)
+                self._file_entries[p] = entries
+            except Exception:
+                # unreadable (or half-written) file: retry on the next scan
+                self._file_entries.pop(p, None)
+                self._file_links.pop(p, None)
+                return False
+        self._stats[p] = stat
+        return True
+
+    def _drop(self, p: str) -> Optional[Tuple[int, int]]:
+        self._file_entries.pop(p, None)
+        self._file_links.pop(p, None)
+        self._file_gen.pop(p, None)
+        return self._stats.pop(p, None)
+
+    def _apply(self, changed: List[str], removed: List[str], found: Dict[str, Tuple[int, int]],
+               loaded: Optional[Dict[str, tuple]] = None) -> None:
+        if not removed and not changed:
+            return
+        rebuild = bool(removed) or any(p in self._file_entries for p in changed)
+        gone = {p: st for p, st in ((p, self._drop(p)) for p in removed) if st is not None}
+        read = [p for p in changed if self._load(p, found[p], loaded)]
+        if not gone and not read:
+            return
+        gens: Dict[str, int] = {}
+        if self.shared is not None:
+            gen, gens, more, less = self.shared.number(self.data_dir, {p: self._stats[p] for p in read}, gone,
+                                                       self._stats, self._generation)
+            for p in less:
+                self._drop(p)
+                rebuild = True
+            for p, (st, g) in more.items():
+                rebuild = rebuild or p in self._file_entries
+                if self._load(p, st):
+                    read.append(p)
+                    gens[p] = g
+        else:
+            gen = self._generation + 1
+        for p in read:
+            self._file_gen[p] = gens.get(p, gen)
+        if rebuild:
+            # files were dropped or replaced: their runs would otherwise stay in the table until it fills
+            self._interner.prune(e[4] for entries in self._file_entries.values() for e in entries)
+
+        known = sorted(p for p in self._stats if p not in read)
+        appended = sorted(read)
+        self._generation = gen
+        newest = max((st[0] for st in self._stats.values()), default=0) / 1e9
+        # a removal can leave the newest mtime where it was; Last-Modified must still move forward
+        self._last_modified = newest if newest > self._last_modified else time.time()
+        # _append extends self._keys in place, so note now whether this is the first build
+        before, first = self._keys, not self._keys
+        if rebuild or (known and appended and appended[0] < known[-1]):
+            self._rebuild()
+            keys = self._keys
+            added = [oid for oid, key in keys.items() if before.get(oid) != key]
+            dropped = tuple(oid for oid in before if oid not in keys)
+        else:
+            added = [row[0][1] for row in self._append(appended)]
+            dropped = ()
+        self._log(gen, first, added, dropped)
+
+    def _log(self, gen: int, first: bool, added: List[str], dropped: Tuple[str, ...]) -> None:
+        horizon, log = self._changelog
+        if first and not log:
+            # the first build is everything there is; consumers start from its generation
+            self._changelog = (gen, ())
+        else:
+            keys = self._keys
+            added.sort(key=keys.__getitem__)
+            log += ((gen, tuple(added), dropped),)
+            if len(log) > self.changelog_size:
+                horizon, log = log[-self.changelog_size - 1][0], log[-self.changelog_size:]
+            self._changelog = (horizon, log)
+        for fn in self._listeners:
+            fn(gen)
+
+    def subscribe(self, fn: Callable[[int], None]) -> None:
+        """Call fn(generation) after each build is published (from whichever thread built it)."""
+        self._listeners.append(fn)
+
+    def changes(self, since: Optional[int], limit: Optional[int] = None) -> Tuple[int, bool, List[Change]]:
+        """Builds after generation `since`, oldest first: (generation reached, complete, changes).
+
+        With `since` None, only the generation to start following from.
+
+        Walks the log backwards from the newest build, so the cost follows the size of
+        the delta, not of the store. `complete` is False when `since` predates the
+        log, and the caller has to re-read everything. With `limit`, whole builds are
+        returned until that many ids are reached; the generation reached then lags
+        the store's and the caller asks again from there. A `since` ahead of this
+        store is caught up with first when generations are shared; if it is still
+        ahead (without a marker: from before a restart) the answer is incomplete too.
+        """
+        if since is not None:
+            self._catch_up(since)
+        self.refresh()
+        horizon, log = self._changelog
+        # taken from the log rather than the view: a build is published a moment before it is logged
+        generation = log[-1][0] if log else horizon
+        if since is None:
+            return generation, True, []
+        i = len(log)
+        while i and log[i - 1][0] > since:
+            i -= 1
+        out = list(log[i:])
+        if limit is not None:
+            count = 0
+            for n, (_, added, dropped) in enumerate(out):
+                count += len(added) + len(dropped)
+                if count > limit and n:
+                    out = out[:n]
+                    generation = out[-1][0]
+                    break
+        return generation, horizon <= since <= generation, out
+
+    def _take(self, p: str, keys: Dict[str, Key], rows: List[Row]) -> None:
+        # rows (and their iocs/relationships) from file `p` whose ids no earlier file claimed
+        fgen = self._file_gen[p]
+        won: Dict[str, Key] = {}
+        for oid, otype, ts, ver, raw, gen in self._file_entries[p]:
+            if oid not in keys:
+                key = keys[oid] = won[oid] = (-ts, oid)
+                rows.append((key, otype, ver, raw, _first_generation(gen, fgen)))
+        iocs, rels, names = self._file_links.get(p, ((), (), ()))
+        for oid, kind, value in iocs:
+            key = won.get(oid)
+            if key is not None:
+                self._ioc_rows.append((kind, value, key))
+        for oid, rtype, src, tgt in rels:
+            key = won.get(oid)
+            if key is not None:
+                self._rel_rows.append((key, rtype, src, tgt))
+        for oid, name in names:
+            key = won.get(oid)
+            if key is not None:
+                self._name_rows.append((name, key))
+
+    def _rebuild(self) -> None:
+        keys: Dict[str, Key] = {}
+        rows: List[Row] = []
+        self._ioc_rows = []
+        self._rel_rows = []
+        self._name_rows = []
+        for p in sorted(self._file_entries):
+            self._take(p, keys, rows)
+        self._keys = keys
+        self._publish(rows)
+
+    def _append(self, paths: List[str]) -> List[Row]:
+        # rows are only ever added here, so the new ones are merged into the published
+        # build instead of re-sorting and re-indexing all of it
+        marks = len(self._ioc_rows), len(self._rel_rows), len(self._name_rows)
+        fresh: List[Row] = []
+        for p in paths:
+            self._take(p, self._keys, fresh)
+        view = self._view
+        if len(fresh) * 8 > len(view.keys):
+            # a batch this size against the whole build: one sort is cheaper
+            self._publish(list(zip(view.keys, view.types, view.versions, view.raws, view.gens)) + fresh)
+            return fresh
+        fresh.sort(key=lambda r: r[0])
+        keys = view.keys
+        # where each new row goes in the old columns; they are in key order, so these ascend
+        at = [bisect_left(keys, r[0]) for r in fresh]
+        by_type: Dict[str, array] = {}
+        for t in set(view.by_type).union(r[1] for r in fresh):
+            by_type[t] = _shifted(view.by_type.get(t, array("q")), at, [r[1] == t for r in fresh])
+        iocs = dict(view.iocs)
+        added: Dict[Tuple[str, str], List[Key]] = {}
+        for kind, value, key in self._ioc_rows[marks[0]:]:
+            added.setdefault((kind, value), []).append(key)
+        for (kind, value), ks in added.items():
+            if iocs.get(kind) is view.iocs.get(kind):
+                iocs[kind] = dict(iocs.get(kind, ()))
+            iocs[kind][value] = iocs[kind].get(value, []) + ks
+        names = dict(view.names)
+        for name, key in self._name_rows[marks[2]:]:
+            names[name] = names.get(name, []) + [key]
+        # lists are shared with the build readers may still hold, so they are replaced, never extended
+        graph = dict(view.graph)
+        edges: Dict[str, List[Edge]] = {}
+        pending, self._dangling = self._dangling + self._rel_rows[marks[1]:], []
+        self._link(pending, edges)
+        for oid, more in edges.items():
+            graph[oid] = graph.get(oid, []) + more
+        self._view = _View(_spliced(keys, at, [r[0] for r in fresh]), _spliced(view.types, at, [r[1] for r in fresh]),
+                           _spliced(view.versions, at, [r[2] for r in fresh]), _spliced(view.raws, at, [r[3] for r in fresh]),
+                           _spliced(view.gens, at, [r[4] for r in fresh]), self._generation, self._fingerprint(),
+                           self._last_modified, iocs, graph, names, by_type)
+        return fresh
+
+    def _link(self, rels: List[Tuple[Key, str, str, str]], graph: Dict[str, List[Edge]]) -> None:
+        known = self._keys
+        for row in rels:
+            rkey, rtype, src, tgt = row
+            skey, tkey = known.get(src), known.get(tgt)
+            # dangling refs (endpoint not in DATA_DIR) can't be traversed until it turns up
+            if skey is None or tkey is None:
+                self._dangling.append(row)
+                continue
+            graph.setdefault(src, []).append((rtype, rkey, tkey, "out"))
+            graph.setdefault(tgt, []).append((rtype, rkey, skey, "in"))
+
+    def _fingerprint(self) -> str:
+        # derived from what is on disk, so it survives restarts and matches across processes
+        return hashlib.sha256(repr(sorted(self._stats.items())).encode("utf-8")).hexdigest()
+
+    def _publish(self, rows: List[Row]) -> None:
+        rows.sort(key=lambda r: r[0])
+        iocs: Dict[str, Dict[str, List[Key]]] = {}
+        for kind, value, key in self._ioc_rows:
+            iocs.setdefault(kind, {}).setdefault(value, []).append(key)
+        graph: Dict[str, List[Edge]] = {}
+        self._dangling = []
+        self._link(self._rel_rows, graph)
+        names: Dict[str, List[Key]] = {}
+        for name, key in self._name_rows:
+            names.setdefault(name, []).append(key)
+        # versions and generations as machine ints: 8 bytes each instead of an int object apiece
+        self._view = _View([r[0] for r in rows], [r[1] for r in rows], array("q", [r[2] for r in rows]), [r[3] for r in rows],
+                           array("q", [r[4] for r in rows]), self._generation, self._fingerprint(), self._last_modified, iocs,
+                           graph, names)
+
+    def page(self, since: Optional[str] = None, types: Optional[Iterable[str]] = None, size: Optional[int] = None,
+             after: Optional[Tuple[int, str]] = None, skip: int = 0, as_of: Optional[int] = None, raw: bool = False,
+             timings: Optional[Dict[str, float]] = None, until: Optional[str] = None, ids: Optional[Iterable[str]] = None,
+             versions: Optional[Iterable[int]] = None, meta: bool = False, view: Optional[_View] = None):
+        """Return (items, total, next_position) for one page, newest first.
+
+        `after` is the (ts, id) of the last object already delivered; the page starts right
+        behind it. Objects ingested after generation `as_of` are left out, so a cursor walks
+        the collection as it stood when paging began. `next_position` is (ts, id, generation)
+        to resume from, or None on the last page. With `raw` the items are serialized bytes;
+        with `meta` they are (id, ts, version ts, type) from the index alone.
+        `until` keeps objects strictly older than it; `ids` and `versions` (version ts)
+        restrict to those values. A `timings` dict receives the seconds spent in "filter"
+        (window and count) and "paging". `view` answers from that build (see current())
+        instead of the latest.
+        """
+        if view is None:
+            view = self.current(as_of)
+        keys, gens = view.keys, view.gens
+        if as_of is not None and as_of >= view.generation:
+            as_of = None
+        t0 = time.perf_counter() if timings is not None else 0.0
+        walk, match, total = self._window(view, since, types, until, ids, versions, as_of)
+        if timings is not None:
+            t1 = time.perf_counter()
+            timings["filter"] = t1 - t0
+        if meta:
+            get = lambda i: (keys[i][1], -keys[i][0], view.versions[i], view.types[i])
+        else:
+            get = view.raw if raw else view.obj
+
+        items: List[Any] = []
+        want = size if size is not None else total
+        last = -1
+        more = False
+        for i in walk(bisect_right(keys, (-after[0], after[1])) if after else 0):
+            if (match is None or match(i)) and (as_of is None or gens[i] <= as_of):
+                if skip > 0:
+                    skip -= 1
+                elif len(items) == want:
+                    more = True
+                    break
+                else:
+                    items.append(get(i))
+                    last = i
+        nxt = None
+        if more and last >= 0:
+            nts, nid = keys[last]
+            nxt = (-nts, nid, as_of if as_of is not None else view.generation)
+        if timings is not None:
+            timings["paging"] = time.perf_counter() - t1
+        return items, total, nxt
+
+    def _window(self, view: _View, since: Optional[str], types: Optional[Iterable[str]], until: Optional[str] = None,
+                ids: Optional[Iterable[str]] = None, versions: Optional[Iterable[int]] = None, as_of: Optional[int] = None):
+        """(walk, predicate or None, matching total) for a filtered time window.
+
+        `walk(start)` yields the window's candidate positions >= start in order. The
+        time bounds are bisects over the keys (or a type's positions), so with only
+        time and type filters the total costs O(log n) and a page touches nothing
+        outside the types asked for. With `as_of` the total leaves out objects served
+        after that generation (the predicate does not: page() checks generations
+        itself); those are few, and found once per build (see _View.newer()).
+        """
+        keys = view.keys
+        lo, end = 0, len(keys)
+        if until:
+            lo = bisect_left(keys, (-parse_ts(until) + 1,))
+        if since:
+            end = bisect_left(keys, (-parse_ts(since) + 1,))
+        end = max(lo, end)
+        type_set = set(types) if types else None
+        # each part is (ascending positions, first index, stop index) within the window
+        parts: List[Tuple[Any, int, int]]
+        if ids is not None:
+            # ids resolve straight to positions: no walk over the rest of the collection
+            found = sorted(i for i in {self._locate(view, oid) for oid in ids}
+                           if lo <= i < end and (type_set is None or view.types[i] in type_set))
+            parts = [(found, 0, len(found))]
+        elif type_set is not None:
+            parts = []
+            for t in type_set:
+                positions = view.by_type.get(t)
+                if positions:
+                    parts.append((positions, bisect_left(positions, lo), bisect_left(positions, end)))
+        else:
+            parts = [(range(lo, end), 0, end - lo)]
+
+        def walk(start: int):
+            # index from the bisected start: an islice would step through everything before it
+            its = [map(seq.__getitem__, range(max(a, bisect_left(seq, start, a, b)), b)) for seq, a, b in parts]
+            return its[0] if len(its) == 1 else merge(*its)
+
+        def inside(i: int) -> bool:
+            for seq, a, b in parts:
+                j = bisect_left(seq, i, a, b)
+                if j < b and seq[j] == i:
+                    return True
+            return False
+
+        match = None
+        ver_set = set(versions) if versions else None
+        if ver_set is None:
+            total = sum(b - a for _, a, b in parts)
+        else:
+            overs = view.versions
+            match = lambda i: overs[i] in ver_set
+            total = sum(1 for i in walk(0) if match(i))
+        if as_of is not None and as_of < view.generation:
+            total -= sum(1 for i in view.newer(as_of) if inside(i) and (match is None or match(i)))
+        return walk, match, total
+
+    def scan(self, since: Optional[str] = None, types: Optional[Iterable[str]] = None, raw: bool = False,
+             until: Optional[str] = None, ids: Optional[Iterable[str]] = None, versions: Optional[Iterable[int]] = None):
+        """Return (total, iterator) over every matching object, newest first; filters as for page().
+
+        The iterator is pinned to the build current at call time and yields lazily,
+        so callers can stream a collection of any size.
+        """
+        self.refresh()
+        view = self._view
+        walk, match, total = self._window(view, since, types, until, ids, versions)
+
+        def _iter():
+            get = view.raw if raw else view.obj
+            for i in walk(0):
+                if match is None or match(i):
+                    yield get(i)
+        return total, _iter()
+
+    def meta(self, oid: str) -> Optional[Tuple[str, int, int, str]]:
+        """(id, ts, version ts, type) for `oid` from the index alone, or None."""
+        self.refresh()
+        view = self._view
+        i = self._locate(view, oid)
+        if i < 0:
+            return None
+        return oid, -view.keys[i][0], view.versions[i], view.types[i]
+
+    def lookup(self, pairs: Iterable[Tuple[str, str]], raw: bool = False, objects: bool = True):
+        """Match (ioc type, normalized value) pairs against the IOC index.
+
+        Returns one list per pair, in order: the matching indicators (or just their
+        ids with `objects=False`, which never touches object bodies). Each value is
+        a single hash probe; resolving an object to return adds one bisect.
+        """
+        self.refresh()
+        view = self._view
+        get = view.raw if raw else view.obj
+        out: List[List[Any]] = []
+        for kind, value in pairs:
+            keys = view.iocs.get(kind, {}).get(value, ())
+            if not objects:
+                out.append([k[1] for k in keys])
+                continue
+            out.append([get(i) for i in (view.position(k) for k in keys) if i >= 0])
+        return out
+
+    def _locate(self, view: _View, oid: str) -> int:
+        key = self._keys.get(oid)
+        return view.position(key) if key is not None else -1
+
+    def neighborhood(self, oid: str, depth: int = 1, rel_types: Optional[Iterable[str]] = None, direction: str = "both",
+                     limit: int = 1000, raw: bool = False) -> Optional[Dict[str, Any]]:
+        """`oid` plus everything reachable over up to `depth` relationships, breadth first.
+
+        `direction` is "out" (source_ref -> target_ref), "in" or "both". Work grows with
+        the edges visited, not the collection; at most `limit` neighbours are returned
+        and `truncated` says whether more were left. None if `oid` is unknown.
+        """
+        self.refresh()
+        view = self._view
+        root = self._locate(view, oid)
+        if root < 0:
+            return None
+        rel_set = set(rel_types) if rel_types else None
+        seen = {oid}
+        seen_rels = set()
+        nodes: List[Key] = []
+        rels: List[Key] = []
+        truncated = False
+        frontier = [oid]
+        for _ in range(depth):
+            nxt: List[str] = []
+            for cur in frontier:
+                for rtype, rkey, nkey, way in view.graph.get(cur, ()):
+                    if (rel_set is not None and rtype not in rel_set) or (direction != "both" and way != direction):
+                        continue
+                    if nkey[1] in seen:
+                        if rkey[1] not in seen_rels:
+                            seen_rels.add(rkey[1])
+                            rels.append(rkey)
+                        continue
+                    if len(nodes) >= limit:
+                        truncated = True
+                        break
+                    seen.add(nkey[1])
+                    seen_rels.add(rkey[1])
+                    nodes.append(nkey)
+                    rels.append(rkey)
+                    nxt.append(nkey[1])
+                if truncated:
+                    break
+            frontier = nxt
+            if not frontier or truncated:
+                break
+        get = view.raw if raw else view.obj
+        resolve = lambda ks: [get(i) for i in (view.position(k) for k in ks) if i >= 0]
+        return {"root": get(root), "objects": resolve(nodes), "relationships": resolve(rels), "truncated": truncated}
+
+    def attributed(self, actor: str, types: Optional[Iterable[str]] = ("indicator",), limit: Optional[int] = None,
+                   raw: bool = False) -> Optional[List[Any]]:
+        """Objects with an `attributed-to` relationship to `actor`, newest first; None if it is unknown.
+
+        `actor` is an identity id, or a name matched case-insensitively against every
+        identity carrying it (each generator run mints fresh identities per actor).
+        """
+        self.refresh()
+        view = self._view
+        if self._locate(view, actor) >= 0:
+            actor_ids = [actor]
+        else:
+            actor_ids = [k[1] for k in view.names.get(actor.strip().lower(), ())]
+            if not actor_ids:
+                return None
+        type_set = set(types) if types else None
+        found = sorted({nkey for aid in actor_ids for rtype, _, nkey, way in view.graph.get(aid, ())
+                        if rtype == "attributed-to" and way == "in"})
+        get = view.raw if raw else view.obj
+        out: List[Any] = []
+        for key in found:
+            i = view.position(key)
+            if i >= 0 and (type_set is None or view.types[i] in type_set):
+                out.append(get(i))
+                if limit is not None and len(out) >= limit:
+                    break
+        return out
+
+    def query(self, since: Optional[str] = None, types: Optional[Iterable[str]] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        items, _, _ = self.page(since=since, types=types, size=limit if isinstance(limit, int) and limit > 0 else None)
+        return items
+
+    def __len__(self) -> int:
+        return len(self._view.keys)
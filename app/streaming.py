@@ -0,0 +1,34 @@
+from typing import Dict, Any, Iterable, Iterator
+from .serialize import dumps
+
+STREAM_MODES = ("ndjson", "bundle")
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def ndjson_chunks(raws: Iterable[bytes], batch: int = 256) -> Iterator[bytes]:
+    buf = []
+    for raw in raws:
+        buf.append(raw)
+        if len(buf) >= batch:
+            yield b"\n".join(buf) + b"\n"
+            buf = []
+    if buf:
+        yield b"\n".join(buf) + b"\n"
+
+def bundle_chunks(envelope: Dict[str, Any], key: str, raws: Iterable[bytes], batch: int = 256) -> Iterator[bytes]:
+    """Yield `envelope` as JSON with the pre-serialized `raws` streamed in as its `key` array (written last)."""
+    head = dumps(envelope)
+    if head == b"{}":
+        yield b"{" + dumps(key) + b":["
+    else:
+        yield head[:-1] + b"," + dumps(key) + b":["
+    buf = []
+    first = True
+    for raw in raws:
+        buf.append(raw)
+        if len(buf) >= batch:
+            yield (b"" if first else b",") + b",".join(buf)
+            first = False
+            buf = []
+    if buf:
+        yield (b"" if first else b",") + b",".join(buf)
+    yield b"]}"
@@ -0,0 +1,117 @@
+"""Background ingestion of files that appear in, change in or vanish from DATA_DIR.
+
+Uses inotify (through the optional `watchfiles` package, installed with
+uvicorn[standard]) when available and falls back to polling the directory's
+stats otherwise. Either way a file is only ingested once its (mtime, size) has
+held still for `debounce` seconds, so a feed that is still being copied in is
+never parsed half-written. Once the watcher runs, requests stop re-checking
+DATA_DIR themselves (see ObjectStore.managed).
+"""
+import os, threading, time
+from typing import Dict, List, Optional, Tuple
+from .metrics import REGISTRY, Counter
+from .store import ObjectStore, _is_data_file
+
+try:
+    import watchfiles
+except ImportError:
+    watchfiles = None
+
+INGESTED = REGISTRY.register(Counter(
+    "watcher_files_ingested_total", "Files picked up (or dropped) by the DATA_DIR watcher.", ("mode",)))
+
+Stat = Optional[Tuple[int, int]]
+
+def _stat(path: str) -> Stat:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+class DirectoryWatcher:
+    """Feeds settled changes under `store.data_dir` to store.ingest() from a daemon thread.
+
+    `poll` forces the polling fallback; `rescan_interval` is how often the inotify
+    mode also diffs the directory, to recover events the kernel dropped.
+    """
+
+    def __init__(self, store: ObjectStore, debounce: float = 1.0, poll_interval: float = 2.0,
+                 rescan_interval: float = 60.0, poll: bool = False):
+        self.store = store
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.mode = "poll" if poll or watchfiles is None else "inotify"
+        # path -> (stat when last seen, when that stat was first seen)
+        self._pending: Dict[str, Tuple[Stat, float]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="data-dir-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.store.managed = False
+
+    def _run(self) -> None:
+        os.makedirs(self.store.data_dir, exist_ok=True)
+        # the initial load happens here, not in the first request
+        self.store.refresh(force=True)
+        self.store.managed = True
+        print(f"[watcher] watching {self.store.data_dir} ({self.mode})")
+        while not self._stop.is_set():
+            try:
+                if self.mode == "inotify":
+                    self._watch()
+                else:
+                    self._poll()
+            except Exception as e:
+                print(f"[watcher] error: {e}")
+                self._stop.wait(self.poll_interval)
+
+    def _poll(self) -> None:
+        while not self._stop.is_set():
+            self._note(self.store.pending())
+            self._flush()
+            self._stop.wait(self.poll_interval if not self._pending else min(self.poll_interval, self.debounce))
+
+    def _watch(self) -> None:
+        rescanned = float("-inf")
+        root = os.path.abspath(self.store.data_dir)
+        tick = max(50, int(min(self.debounce, self.poll_interval) * 500))
+        for changes in watchfiles.watch(self.store.data_dir, watch_filter=lambda _, path: _is_data_file(os.path.basename(path)),
+                                        debounce=tick, step=50, rust_timeout=tick, yield_on_timeout=True,
+                                        stop_event=self._stop):
+            # spelled the way the store's own scan spells them, so both agree on what is loaded
+            self._note(os.path.join(self.store.data_dir, os.path.relpath(path, root)) for _, path in changes)
+            now = time.monotonic()
+            if now - rescanned >= self.rescan_interval:
+                self._note(self.store.pending())
+                rescanned = now
+            self._flush()
+
+    def _note(self, paths) -> None:
+        now = time.monotonic()
+        for p in paths:
+            if p not in self._pending:
+                self._pending[p] = (_stat(p), now)
+
+    def _flush(self) -> None:
+        now = time.monotonic()
+        ready: List[str] = []
+        for p, (seen, since) in list(self._pending.items()):
+            st = _stat(p)
+            if st != seen:
+                # still being written (or replaced again): restart its quiet period
+                self._pending[p] = (st, now)
+            elif now - since >= self.debounce:
+                del self._pending[p]
+                ready.append(p)
+        if ready:
+            self.store.ingest(*ready)
+            INGESTED.inc(len(ready), self.mode)
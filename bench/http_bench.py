@@ -0,0 +1,317 @@
+"""HTTP load benchmark for the paged endpoints, in-process (ASGI) and over a local uvicorn.
+
+    python -m bench.http_bench --sizes 1000,10000 --modes asgi,uvicorn --out results.json
+
+Each size gets its own data directory, seeded once with app.bulkgen (deterministic
+for a given --seed) and reused across runs when --data-root is given. Every
+scenario (endpoint x paging depth x filter) is fired --requests times at
+--concurrency, and throughput plus p50/p95/p99 latency are written as JSON,
+tagged with the current commit so runs can be compared. Every scenario repeats one
+query, so with the response caches on it mostly measures cache hits: --caches off
+(cold: every request computes and compresses its page) and on (warm: as deployed)
+are run and reported separately, each row tagged with `caches`. Each size also records
+the store's resident memory per object (heap via tracemalloc, and RSS), measured
+in a fresh interpreter so nothing else skews it.
+"""
+import argparse, asyncio, json, os, platform, socket, subprocess, sys, tempfile, time
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from app import bulkgen
+from app.store import ObjectStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_NOW = datetime(2025, 1, 1)
+
+# (name, path, page size parameter); depth and filters are layered on top in _scenarios()
+ENDPOINTS = [
+    ("get_indicators", "/api/v1/indicators", "page_size"),
+    ("get_collection_objects", "/api/v1/collections/indicators/objects", "page_size"),
+    ("taxii_objects", "/taxii2/root/collections/indicators/objects", "limit"),
+]
+
+def _seed(data_root: str, size: int, seed: int, fmt: str = "ndjson") -> str:
+    data_dir = os.path.join(data_root, f"objects-{size}-seed-{seed}" + ("" if fmt == "ndjson" else f"-{fmt}"))
+    done = os.path.join(data_dir, ".seeded")
+    if os.path.exists(done):
+        return data_dir
+    os.makedirs(data_dir, exist_ok=True)
+    report = bulkgen.run(size, data_dir, seed=seed, fmt=fmt, shard_size=100_000, now=SEED_NOW, progress=False)
+    print(f"[bench] seeded {size} objects in {report['seconds']}s -> {data_dir}", file=sys.stderr)
+    with open(done, "w", encoding="utf-8") as fh:
+        fh.write(json.dumps(report["objects"]))
+    return data_dir
+
+def _median_since(data_dir: str) -> str:
+    store = ObjectStore(data_dir, refresh_interval=3600)
+    # load now, whatever refresh_interval and the host's uptime say
+    store.refresh(force=True)
+    view = store.current()
+    if not view.keys:
+        return "1970-01-01T00:00:00Z"
+    ts = -view.keys[len(view.keys) // 2][0]
+    return (datetime(1970, 1, 1) + timedelta(microseconds=ts)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _scenarios(since: str, depths: List[int], page_size: int) -> List[Dict[str, Any]]:
+    out = []
+    for name, path, size_param in ENDPOINTS:
+        since_param = "added_after" if name == "taxii_objects" else "since"
+        filters: List[tuple] = [("none", {}), ("since", {since_param: since})]
+        if name != "get_indicators":
+            filters.append(("types", {"types": "indicator,relationship"}))
+            filters.append(("since+types", {since_param: since, "types": "indicator,relationship"}))
+        for fname, fparams in filters:
+            for depth in depths:
+                out.append({"endpoint": name, "path": path, "filter": fname, "depth": depth,
+                            "params": dict(fparams, **{size_param: page_size})})
+    return out
+
+async def _resolve_depth(client: httpx.AsyncClient, scenario: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # follow `next` tokens to the requested page; None if the collection runs out first
+    params = dict(scenario["params"])
+    for _ in range(scenario["depth"] - 1):
+        r = await client.get(scenario["path"], params=params)
+        r.raise_for_status()
+        token = r.json().get("next")
+        if not token:
+            return None
+        params["next"] = token
+    return params
+
+def _percentile(sorted_ms: List[float], pct: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    k = min(len(sorted_ms) - 1, max(0, int(round(pct / 100.0 * len(sorted_ms) + 0.5)) - 1))
+    return sorted_ms[k]
+
+async def _fire(client: httpx.AsyncClient, path: str, params: Dict[str, Any], requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    received = 0
+    remaining = requests
+
+    async def _worker():
+        nonlocal remaining, errors, received
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path, params=params)
+                received += len(r.content)
+                if r.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(wall, 3),
+        "rps": round(len(latencies) / wall, 1) if wall > 0 else None,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "bytes_per_response": received // len(latencies) if latencies else 0,
+    }
+
+async def _run_scenarios(client: httpx.AsyncClient, scenarios: List[Dict[str, Any]], args, caches: bool) -> List[Dict[str, Any]]:
+    results = []
+    for sc in scenarios:
+        params = await _resolve_depth(client, sc)
+        row = {"endpoint": sc["endpoint"], "filter": sc["filter"], "depth": sc["depth"], "page_size": args.page_size,
+               "caches": "on" if caches else "off"}
+        if params is None:
+            results.append(dict(row, skipped="collection shorter than requested depth"))
+            continue
+        await _fire(client, sc["path"], params, args.warmup, args.concurrency)
+        row.update(await _fire(client, sc["path"], params, args.requests, args.concurrency))
+        print(f"[bench]   {sc['endpoint']:<24} filter={sc['filter']:<12} depth={sc['depth']:<4} caches={row['caches']:<3} "
+              f"{row['rps']:>9} req/s  p50={row['p50_ms']}ms p99={row['p99_ms']}ms", file=sys.stderr)
+        results.append(row)
+    return results
+
+def _server_env(data_dir: str, workers: int = 1, caches: bool = True) -> Dict[str, str]:
+    env = dict(os.environ, DATA_DIR=data_dir, API_KEYS="", GENERATE_ON_START="false",
+               GENERATE_EVERY_SECONDS=str(10 * 365 * 86400), COMPACT_EVERY_SECONDS="0", WORKERS=str(workers),
+               RATE_LIMIT_PER_SECOND="0", MAX_INFLIGHT_PER_KEY="0", MAX_INFLIGHT="0", WATCH_DATA_DIR="false")
+    if not caches:
+        env.update(COMPRESSION_CACHE_MB="0", QUERY_CACHE_MB="0")
+    return env
+
+async def _bench_asgi(data_dir: str, scenarios, args, caches: bool) -> List[Dict[str, Any]]:
+    os.environ.update(_server_env(data_dir))
+    from app import main
+    from app.compression import BodyCache
+    from app.querycache import QueryCache
+    # the app module is imported once; each size gets its own store (startup hooks never run here), and each
+    # run fresh caches, empty or of the configured size
+    main.STORE = ObjectStore(data_dir, refresh_interval=main.STORE_REFRESH_SECONDS)
+    main.STORE.refresh(force=True)
+    main.BODY_CACHE = BodyCache(main.COMPRESSION_CACHE_MB * 1024 * 1024 if caches else 0)
+    main.QUERY_CACHE = QueryCache(main.QUERY_CACHE_MB * 1024 * 1024 if caches else 0)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        return await _run_scenarios(client, scenarios, args, caches)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def _bench_uvicorn(data_dir: str, scenarios, args, caches: bool) -> List[Dict[str, Any]]:
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+                             "--workers", str(args.workers), "--log-level", "warning"],
+                            cwd=ROOT, env=_server_env(data_dir, args.workers, caches))
+    base = f"http://127.0.0.1:{port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base, limits=limits, timeout=120) as client:
+            deadline = time.monotonic() + 120
+            while True:
+                try:
+                    if (await client.get("/healthz")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not come up")
+                await asyncio.sleep(0.2)
+            return await _run_scenarios(client, scenarios, args, caches)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+# run by _memory() in a child interpreter: load the store once and print what it holds
+_MEMORY_PROBE = """
+import gc, json, sys, time
+trace = sys.argv[2] == "heap"
+if trace:
+    import tracemalloc
+    tracemalloc.start()
+def rss():
+    with open("/proc/self/statm") as fh:
+        return int(fh.read().split()[1]) * __import__("os").sysconf("SC_PAGE_SIZE")
+from app.store import ObjectStore
+gc.collect()
+before = tracemalloc.get_traced_memory()[0] if trace else rss()
+t0 = time.perf_counter()
+store = ObjectStore(sys.argv[1], refresh_interval=3600)
+store.refresh(force=True)
+seconds = time.perf_counter() - t0
+gc.collect()
+after = tracemalloc.get_traced_memory()[0] if trace else rss()
+print(json.dumps({"objects": len(store), "bytes": after - before, "seconds": seconds}))
+"""
+
+def _memory(data_dir: str) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for kind in ("heap", "rss"):
+        try:
+            proc = subprocess.run([sys.executable, "-c", _MEMORY_PROBE, data_dir, kind], cwd=ROOT,
+                                  capture_output=True, text=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            out[f"{kind}_error"] = str(e)
+            continue
+        probe = json.loads(proc.stdout.strip().splitlines()[-1])
+        objects = max(probe["objects"], 1)
+        out["objects"] = probe["objects"]
+        out[f"{kind}_bytes_per_object"] = round(probe["bytes"] / objects, 1)
+        if kind == "rss":
+            # the traced run is slowed down by tracemalloc, so time the plain one
+            out["load_seconds"] = round(probe["seconds"], 3)
+    return out
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sizes", default="1000,10000", help="comma-separated corpus sizes, e.g. 1000,10000,100000,1000000")
+    ap.add_argument("--modes", default="asgi,uvicorn", help="asgi, uvicorn or both")
+    ap.add_argument("--depths", default="1,10,50", help="page numbers to measure (reached by following next tokens)")
+    ap.add_argument("--page-size", type=int, default=100)
+    ap.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn workers in uvicorn mode")
+    ap.add_argument("--caches", default="off,on",
+                    help="response caches off (cold: every request computed), on (warm: as deployed) or both")
+    ap.add_argument("--seed", type=int, default=1337)
+    ap.add_argument("--data-root", default=None, help="keep seeded directories here and reuse them across runs")
+    ap.add_argument("--format", default="ndjson", choices=("ndjson", "json"),
+                    help="seed format: ndjson segments (bodies memory-mapped) or json snapshots (bodies held packed in memory)")
+    ap.add_argument("--no-memory", action="store_true", help="skip the per-object memory measurement")
+    ap.add_argument("--out", default=None, help="write JSON results here instead of stdout")
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    depths = [int(d) for d in args.depths.split(",") if d.strip()]
+    caches = [c.strip() for c in args.caches.split(",") if c.strip()]
+    unknown = set(modes) - {"asgi", "uvicorn"}
+    if unknown:
+        ap.error(f"unknown mode(s): {', '.join(sorted(unknown))}")
+    if not caches or set(caches) - {"off", "on"}:
+        ap.error("--caches takes off, on or off,on")
+
+    tmp = None
+    data_root = args.data_root
+    if data_root is None:
+        tmp = tempfile.TemporaryDirectory(prefix="http-bench-")
+        data_root = tmp.name
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": _commit(),
+            "started": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": [],
+        "memory": [],
+    }
+    try:
+        for size in sizes:
+            data_dir = _seed(data_root, size, args.seed, args.format)
+            if not args.no_memory:
+                mem = _memory(data_dir)
+                print(f"[bench] {size} objects resident: {mem.get('heap_bytes_per_object')} B/object heap, "
+                      f"{mem.get('rss_bytes_per_object')} B/object RSS, loaded in {mem.get('load_seconds')}s", file=sys.stderr)
+                report["memory"].append(dict(mem, size=size, format=args.format))
+            scenarios = _scenarios(_median_since(data_dir), depths, args.page_size)
+            for mode in modes:
+                runner = _bench_asgi if mode == "asgi" else _bench_uvicorn
+                for state in caches:
+                    print(f"[bench] {size} objects, {mode}, caches {state}", file=sys.stderr)
+                    for row in asyncio.run(runner(data_dir, scenarios, args, state == "on")):
+                        report["results"].append(dict(row, objects=size, mode=mode))
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compare per-page response rendering: JSONResponse re-encoding vs joining cached bytes.
+
+    python -m bench.serialize_bench --objects 20000 --page-size 1000
+"""
+import argparse, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from app.generator import generate_payload, write_payload
+from app.serialize import assemble
+from app.store import ObjectStore
+
+def _seed(data_dir: str, objects: int) -> None:
+    written = 0
+    while written < objects:
+        payload = generate_payload(min_count=200, max_count=200)
+        write_payload(data_dir, payload)
+        written += len(payload["stixobjects"])
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--objects", type=int, default=20_000)
+    ap.add_argument("--page-size", type=int, default=1000)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        _seed(data_dir, args.objects)
+        store = ObjectStore(data_dir, refresh_interval=3600)
+        store.refresh(force=True)
+        objs, _, _ = store.page(size=args.page_size)
+        raws, _, _ = store.page(size=args.page_size, raw=True)
+
+        def before():
+            JSONResponse(content={"objects": objs, "sourcesystem": "bench", "total": len(store), "more": True, "next": None}).body
+
+        def after():
+            assemble({"objects": raws, "sourcesystem": "bench", "total": len(store), "more": True, "next": None}, "objects", raws)
+
+        t_before = _time(before, args.repeat)
+        t_after = _time(after, args.repeat)
+        print(f"objects={len(store)} page_size={len(objs)}")
+        print(f"JSONResponse re-encode : {t_before * 1000:8.3f} ms/page")
+        print(f"cached bytes assemble  : {t_after * 1000:8.3f} ms/page")
+        print(f"speedup                : {t_before / t_after:8.1f}x")
+
+if __name__ == "__main__":
+    main()
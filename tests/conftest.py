@@ -0,0 +1,57 @@
+import json, os
+import pytest
+from app.paging import decode_token, encode_token
+from app.store import ObjectStore
+
+@pytest.fixture
+def snapshot(tmp_path):
+    """write(n, count, extra) drops snapshot file n with `count` indicators (plus `extra` objects) into tmp_path; returns (path, ids)."""
+    def write(n, count=10, extra=()):
+        objects = [{
+            "type": "indicator",
+            "spec_version": "2.1",
+            "id": f"indicator--{n:04d}{i:04d}-0000-4000-8000-000000000000",
+            "created": f"2026-01-01T00:{n:02d}:{i:02d}.000Z",
+            "modified": f"2026-01-01T00:{n:02d}:{i:02d}.000Z",
+            "valid_from": f"2026-01-01T00:{n:02d}:{i:02d}.000Z",
+            "pattern": f"[ipv4-addr:value = '10.0.{n}.{i}']",
+        } for i in range(count)]
+        objects.extend(extra)
+        path = os.path.join(str(tmp_path), f"indicators_{n:04d}.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"stixobjects": objects}, fh)
+        return path, [o["id"] for o in objects]
+    return write
+
+@pytest.fixture
+def walk():
+    """walk(store, token) follows paging tokens to the end; returns the ids seen."""
+    def follow(store, token, size=10):
+        seen = []
+        while True:
+            items, _, nxt = store.page(size=size, **decode_token(token))
+            seen.extend(o["id"] for o in items)
+            if nxt is None:
+                return seen
+            token = encode_token(*nxt)
+    return follow
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """A TestClient for app.main serving a fresh store over tmp_path, with empty caches.
+
+    Startup hooks never run, so there is no generator or watcher: each request
+    rescans tmp_path itself.
+    """
+    for name, value in {"DATA_DIR": str(tmp_path), "API_KEYS": "", "GENERATE_ON_START": "false",
+                        "RATE_LIMIT_PER_SECOND": "0", "MAX_INFLIGHT_PER_KEY": "0", "MAX_INFLIGHT": "0"}.items():
+        # only read by the first import of app.main
+        monkeypatch.setenv(name, value)
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.compression import BodyCache
+    from app.querycache import QueryCache
+    monkeypatch.setattr(main, "STORE", ObjectStore(str(tmp_path), refresh_interval=0))
+    monkeypatch.setattr(main, "BODY_CACHE", BodyCache(1 << 20))
+    monkeypatch.setattr(main, "QUERY_CACHE", QueryCache(1 << 20))
+    return TestClient(main.app)
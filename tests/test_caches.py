@@ -0,0 +1,49 @@
+import threading, time
+from app.compression import BodyCache
+from app.querycache import QueryCache
+
+def test_body_cache_evicts_by_bytes_and_skips_oversized():
+    cache = BodyCache(100)
+    cache.put(("a", "gzip"), b"x" * 25)
+    # over a quarter of the budget: not kept, and nothing else is flushed for it
+    cache.put(("big", "gzip"), b"x" * 26)
+    assert cache.get(("big", "gzip")) is None and cache.get(("a", "gzip")) == b"x" * 25
+    for i in range(4):
+        cache.put((str(i), "gzip"), b"y" * 25)
+    assert cache.get(("a", "gzip")) is None
+    assert cache.evictions == 1
+
+def test_body_cache_keeps_a_stream_with_its_media_type_and_headers():
+    cache = BodyCache(1 << 20)
+    headers = {"X-Total-Count": "2", "Content-Encoding": "gzip"}
+    assert b"".join(cache.tee(("e", "gzip"), iter([b"a", b"b"]), "application/x-ndjson", headers)) == b"ab"
+    assert cache.get(("e", "gzip")) == (b"ab", "application/x-ndjson", headers)
+
+def test_query_cache_computes_once_for_concurrent_callers():
+    cache = QueryCache(1 << 20)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ([b"page"], 1, None)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute, lambda r: 4)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute, lambda r: 4)))
+                 for _ in range(3)]
+    for t in followers:
+        t.start()
+    deadline = time.monotonic() + 5
+    while cache.coalesced < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+    assert len(calls) == 1 and len(results) == 4
+    assert cache.get_or_compute("k", compute, lambda r: 4) == ([b"page"], 1, None)
+    assert (cache.misses, cache.hits, cache.coalesced) == (1, 1, 3)
@@ -0,0 +1,50 @@
+import os
+from app.compaction import compact
+from app.store import ObjectStore
+
+TS = "2026-01-01T01:00:00.000Z"
+
+def _columns(store):
+    view = store.current()
+    graph = {k: sorted(v) for k, v in view.graph.items()}
+    return (view.keys, view.types, list(view.versions), [view.raw(i) for i in range(len(view.keys))],
+            view.iocs, graph, view.names)
+
+def test_checkpoint_round_trip(tmp_path, snapshot):
+    actor = {"type": "identity", "spec_version": "2.1", "id": "identity--00000001-0000-4000-8000-000000000000",
+             "created": TS, "modified": TS, "name": "Crimson Lynx"}
+    store = ObjectStore(str(tmp_path), refresh_interval=3600)
+    for n in range(4):
+        store.ingest(snapshot(n)[0])
+    # a segment among the JSON snapshots: its bodies are referenced, not copied
+    compact(str(tmp_path), min_files=2, keep_recent=2, store=store)
+    _, ids = snapshot(4, count=2)
+    rel = {"type": "relationship", "spec_version": "2.1", "id": "relationship--00000001-0000-4000-8000-000000000000",
+           "created": TS, "modified": TS, "relationship_type": "attributed-to", "source_ref": ids[0], "target_ref": actor["id"]}
+    store.ingest(snapshot(4, count=2, extra=[actor, rel])[0])
+    ckpt = os.path.join(str(tmp_path), ".store.ckpt")
+    assert store.save_checkpoint(ckpt) == store.generation
+
+    warm = ObjectStore(str(tmp_path), refresh_interval=3600)
+    files = len(store._stats)
+    assert warm.warm_start(ckpt) == files
+    assert warm.ready and _columns(warm) == _columns(store)
+    assert max(warm.current().gens) <= warm.generation
+    assert warm.attributed("crimson lynx")[0]["id"] == ids[0]
+
+    # files that changed or vanished since are re-read or dropped in the same build
+    newest = snapshot(5, count=3)[0]
+    store.ingest(newest)
+    os.remove(os.path.join(str(tmp_path), "indicators_0003.json"))
+    store.ingest(os.path.join(str(tmp_path), "indicators_0003.json"))
+    again = ObjectStore(str(tmp_path), refresh_interval=3600)
+    assert again.warm_start(ckpt) == files - 1
+    assert _columns(again) == _columns(store)
+
+def test_damaged_checkpoint_is_a_cold_start(tmp_path, snapshot):
+    snapshot(0)
+    ckpt = os.path.join(str(tmp_path), ".store.ckpt")
+    with open(ckpt, "wb") as fh:
+        fh.write(b"not a checkpoint")
+    store = ObjectStore(str(tmp_path), refresh_interval=3600)
+    assert store.warm_start(ckpt) == 0 and len(store) == 10
@@ -0,0 +1,51 @@
+TS = "2026-01-01T01:00:00.000Z"
+
+def _sdo(otype, n, **fields):
+    return dict({"type": otype, "spec_version": "2.1", "id": f"{otype}--{n:08d}-0000-4000-8000-000000000000",
+                 "created": TS, "modified": TS}, **fields)
+
+def _rel(n, rtype, src, tgt):
+    return _sdo("relationship", n, relationship_type=rtype, source_ref=src["id"], target_ref=tgt["id"])
+
+def _corpus(snapshot):
+    actor = _sdo("identity", 1, name="Crimson Lynx")
+    # each generator run mints a fresh identity per actor, so names repeat
+    again = _sdo("identity", 2, name="crimson lynx ")
+    malware = _sdo("malware", 1, name="lynxdrop")
+    _, ids = snapshot(0, count=3)
+    ind = [{"id": i} for i in ids]
+    rels = [_rel(1, "indicates", ind[0], malware), _rel(2, "attributed-to", ind[0], actor),
+            _rel(3, "attributed-to", ind[1], again), _rel(4, "uses", actor, malware)]
+    snapshot(1, count=0, extra=[actor, again, malware] + rels)
+    return ids, actor, malware, rels
+
+def test_neighborhood_follows_relationships_by_depth_and_direction(api, snapshot):
+    ids, actor, malware, rels = _corpus(snapshot)
+    r = api.get(f"/api/v1/objects/{ids[0]}/neighborhood")
+    hood = r.json()
+    assert r.status_code == 200 and hood["root"]["id"] == ids[0] and not hood["truncated"]
+    assert {o["id"] for o in hood["objects"]} == {actor["id"], malware["id"]}
+    assert {o["id"] for o in hood["relationships"]} == {rels[0]["id"], rels[1]["id"]}
+
+    two = api.get(f"/api/v1/objects/{ids[0]}/neighborhood", params={"depth": 2}).json()
+    # the actor -> malware edge links two nodes already found: no new node, one more relationship
+    assert {o["id"] for o in two["objects"]} == {actor["id"], malware["id"]}
+    assert rels[3]["id"] in {o["id"] for o in two["relationships"]}
+
+    inbound = api.get(f"/api/v1/objects/{malware['id']}/neighborhood", params={"direction": "in"}).json()
+    assert {o["id"] for o in inbound["objects"]} == {ids[0], actor["id"]}
+    typed = api.get(f"/api/v1/objects/{malware['id']}/neighborhood", params={"relationship_types": "uses"}).json()
+    assert [o["id"] for o in typed["objects"]] == [actor["id"]]
+    capped = api.get(f"/api/v1/objects/{malware['id']}/neighborhood", params={"limit": 1}).json()
+    assert len(capped["objects"]) == 1 and capped["truncated"]
+    assert api.get("/api/v1/objects/indicator--missing/neighborhood").status_code == 404
+
+def test_actor_indicators_by_id_and_by_name(api, snapshot):
+    ids, actor, _, _ = _corpus(snapshot)
+    by_id = api.get(f"/api/v1/actors/{actor['id']}/indicators").json()
+    assert [o["id"] for o in by_id["indicators"]] == [ids[0]]
+    # every identity named that way, case-insensitively, newest indicator first
+    by_name = api.get("/api/v1/actors/CRIMSON LYNX/indicators").json()
+    assert [o["id"] for o in by_name["indicators"]] == [ids[1], ids[0]] and by_name["count"] == 2
+    assert api.get("/api/v1/actors/crimson lynx/indicators", params={"limit": 1}).json()["count"] == 1
+    assert api.get("/api/v1/actors/nobody/indicators").status_code == 404
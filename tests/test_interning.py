@@ -0,0 +1,49 @@
+import os
+from app.interning import Interner, Packed, materialize
+from app.serialize import dumps, loads
+from app.store import ObjectStore
+
+def test_packed_bodies_join_back_to_their_exact_bytes():
+    interner = Interner()
+    objects = [
+        {"type": "indicator", "spec_version": "2.1", "id": "indicator--1", "labels": ["malicious-activity"],
+         "pattern": "[ipv4-addr:value = '10.0.0.1']", "description": "it's \"quoted\" \u00e9", "valid_from": "2026-01-01T00:00:00Z"},
+        # unique fields back to back, first and last
+        {"id": "relationship--1", "source_ref": "a--1", "target_ref": "b--1", "type": "relationship"},
+        {"type": "identity", "name": "no unique field but id", "id": "identity--1"},
+        {"type": "note", "content": "nothing unique at all"},
+        {"type": "indicator", "id": "indicator--2", "pattern": "[ipv4-addr:value = '10.0.0.1']", "extra": {"id": "nested"}},
+    ]
+    for obj in objects:
+        packed = interner.pack(obj)
+        assert materialize(packed) == dumps(obj) and loads(materialize(packed)) == obj
+        if "id" in obj:
+            assert type(packed) is Packed and obj["id"].encode() in b"".join(packed[1::2])
+    # the same non-unique runs come back as the same objects
+    a = interner.pack(dict(objects[0], id="indicator--3", pattern="[ipv4-addr:value = '10.0.0.3']"))
+    b = interner.pack(dict(objects[0], id="indicator--4", pattern="[ipv4-addr:value = '10.0.0.4']"))
+    assert all(x is y for x, y in zip(a[::2], b[::2]))
+
+def test_prune_drops_runs_only_dropped_bodies_used():
+    interner = Interner()
+    kept = interner.pack({"type": "indicator", "id": "indicator--1", "labels": ["a"], "pattern": "[x]"})
+    gone = interner.pack({"type": "malware", "id": "malware--1", "labels": ["only-here"]})
+    before = len(interner)
+    interner.prune([kept])
+    assert 0 < len(interner) < before
+    # what the kept body shares is still shared with the next one packed
+    again = interner.pack({"type": "indicator", "id": "indicator--2", "labels": ["a"], "pattern": "[y]"})
+    assert again[0] is kept[0] and again[-1] is kept[-1]
+    assert gone[-1] not in interner._runs
+
+def test_store_prunes_the_interner_when_files_go(tmp_path, snapshot):
+    store = ObjectStore(str(tmp_path), refresh_interval=3600)
+    first, _ = snapshot(0)
+    store.ingest(first)
+    alone = len(store._interner)
+    second, _ = snapshot(1)
+    store.ingest(second)
+    assert len(store._interner) > alone
+    os.remove(second)
+    store.ingest(second)
+    assert len(store._interner) == alone
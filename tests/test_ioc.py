@@ -0,0 +1,44 @@
+from app.ioc import normalize, parse_pattern
+from app.store import ObjectStore
+
+SHA256 = "AB" * 32
+
+def _indicator(n, pattern):
+    ts = "2026-01-01T02:00:00.000Z"
+    return {"type": "indicator", "spec_version": "2.1", "id": f"indicator--{n:08d}-0000-4000-8000-000000000000",
+            "created": ts, "modified": ts, "valid_from": ts, "pattern": pattern}
+
+def test_normalize_and_parse_pattern():
+    assert normalize("domain", " Evil.Example.COM. ") == "evil.example.com"
+    assert normalize("email", "Ops@Example.com") == "ops@example.com"
+    assert normalize("sha256", SHA256) == SHA256.lower()
+    assert normalize("ipv6", "2001:DB8::1") == "2001:db8::1"
+    # case matters in a URL path, so it is only trimmed
+    assert normalize("url", " https://x.test/A ") == "https://x.test/A"
+    pattern = (f"[domain-name:value = 'Evil.Example.' OR file:hashes.'SHA-256' = '{SHA256}'] AND "
+               "[url:value = 'https://x.test/it\\'s'] AND [identity:name = 'ignored'] AND [ipv4-addr:value != '10.0.0.1']")
+    assert parse_pattern(pattern) == [("domain", "evil.example"), ("sha256", SHA256.lower()),
+                                      ("url", "https://x.test/it's")]
+
+def test_store_lookup_by_normalized_value(tmp_path, snapshot):
+    store = ObjectStore(str(tmp_path), refresh_interval=3600)
+    path, ids = snapshot(0, count=3, extra=[_indicator(1, "[domain-name:value = 'evil.example']"),
+                                            _indicator(2, "[domain-name:value = 'EVIL.example.']")])
+    store.ingest(path)
+    ipv4, domain = store.lookup([("ipv4", "10.0.0.2"), ("domain", normalize("domain", "Evil.Example"))])
+    assert [o["id"] for o in ipv4] == [ids[2]]
+    assert sorted(o["id"] for o in domain) == sorted(ids[3:])
+    assert store.lookup([("ipv4", "10.9.9.9"), ("domain", "evil.example")], objects=False) == [[], ids[3:]]
+
+def test_lookup_endpoints(api, snapshot):
+    _, ids = snapshot(0, count=3, extra=[_indicator(1, f"[file:hashes.'SHA-256' = '{SHA256}']")])
+    r = api.get("/api/v1/iocs/lookup", params={"value": f" {SHA256} "})
+    body = r.json()
+    assert r.status_code == 200 and body["found"]
+    assert [(m["type"], [o["id"] for o in m["indicators"]]) for m in body["matches"]] == [("sha256", [ids[3]])]
+    assert api.get("/api/v1/iocs/lookup", params={"value": "10.0.0.1", "type": "nope"}).status_code == 400
+
+    batch = api.post("/api/v1/iocs/lookup", json={"values": ["10.0.0.1", "10.0.0.7", SHA256.lower()]}).json()
+    assert batch["count"] == 3 and batch["matched"] == 2
+    assert [(r["value"], r["type"], r["ids"]) for r in batch["results"]] == [("10.0.0.1", "ipv4", [ids[1]]),
+                                                                          (SHA256.lower(), "sha256", [ids[3]])]
@@ -0,0 +1,38 @@
+import asyncio
+from app.limits import RateLimitMiddleware
+
+def _scope(path, addr="10.0.0.1"):
+    return {"type": "http", "path": path, "headers": [], "client": (addr, 1234)}
+
+async def _request(app, path, addr="10.0.0.1"):
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    await app(_scope(path, addr), None, send)
+    return statuses[0]
+
+def test_held_requests_keep_out_of_inflight_caps():
+    async def run():
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            if scope["path"] == "/stream":
+                await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        limiter = RateLimitMiddleware(app, max_inflight_per_client=2, max_inflight=3, held=("/stream",),
+                                      max_held_per_client=4)
+        streams = [asyncio.ensure_future(_request(limiter, "/stream")) for _ in range(4)]
+        await asyncio.sleep(0)
+        assert limiter.inflight == 0
+        # more subscribers than either in-flight cap, and the API still answers
+        assert await _request(limiter, "/api") == 200
+        assert await _request(limiter, "/stream") == 429
+        release.set()
+        assert await asyncio.gather(*streams) == [200] * 4
+
+    asyncio.run(run())
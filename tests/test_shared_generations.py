@@ -0,0 +1,60 @@
+import os
+from app.paging import encode_token
+from app.store import ObjectStore
+
+def _workers(tmp_path, n=2):
+    marker = os.path.join(str(tmp_path), ".generation")
+    return [ObjectStore(str(tmp_path), refresh_interval=3600, marker=marker) for _ in range(n)]
+
+def test_token_from_one_worker_pages_on_another(tmp_path, snapshot, walk):
+    a, b = _workers(tmp_path)
+    expected = []
+    for n in range(7):
+        path, ids = snapshot(n)
+        a.ingest(path)
+        expected.extend(ids)
+        if n == 2:
+            b.refresh(force=True)
+    items, _, nxt = a.page(size=10)
+    # b numbers a file of its own before it has seen a's last four
+    b.ingest(snapshot(40)[0])
+
+    seen = [o["id"] for o in items] + walk(b, encode_token(*nxt))
+    assert sorted(seen) == sorted(expected)
+    a.refresh(force=True)
+    assert a.generation == b.generation
+    assert list(a.current().gens) == list(b.current().gens)
+
+def test_lagging_worker_catches_up_to_a_token(tmp_path, snapshot, walk):
+    a, b = _workers(tmp_path)
+    # b is kept current by a watcher that has not fired yet
+    b.managed = True
+    expected = []
+    for n in range(7):
+        path, ids = snapshot(n)
+        a.ingest(path)
+        expected.extend(ids)
+        if n == 2:
+            b.refresh(force=True)
+    items, _, nxt = a.page(size=10)
+
+    seen = [o["id"] for o in items] + walk(b, encode_token(*nxt))
+    assert sorted(seen) == sorted(expected)
+    assert b.generation == a.generation
+
+def test_change_feed_positions_agree(tmp_path, snapshot):
+    a, b = _workers(tmp_path)
+    for n in range(3):
+        a.ingest(snapshot(n)[0])
+    b.refresh(force=True)
+    since = a.generation
+    a.ingest(snapshot(3)[0])
+    os.remove(os.path.join(str(tmp_path), "indicators_0000.json"))
+    b.refresh(force=True)
+    a.refresh(force=True)
+
+    reached_a, complete_a, changes_a = a.changes(since)
+    reached_b, complete_b, changes_b = b.changes(since)
+    assert complete_a and complete_b and reached_a == reached_b
+    flat = lambda changes: (sorted(i for _, added, _ in changes for i in added), sorted(i for _, _, gone in changes for i in gone))
+    assert flat(changes_a) == flat(changes_b)
@@ -0,0 +1,52 @@
+ROOT = "/taxii2/root/collections/indicators"
+
+def test_manifest_pages_from_the_index_with_date_headers(api, snapshot):
+    _, ids = snapshot(0, count=5)
+    r = api.get(f"{ROOT}/manifest", params={"limit": 2})
+    body = r.json()
+    assert r.status_code == 200 and r.headers["content-type"].startswith("application/taxii+json")
+    # newest first
+    assert [e["id"] for e in body["objects"]] == [ids[4], ids[3]] and body["more"]
+    assert body["objects"][0] == {"id": ids[4], "date_added": "2026-01-01T00:00:04.000000Z",
+                                  "version": "2026-01-01T00:00:04.000000Z", "media_type": "application/stix+json;version=2.1"}
+    assert r.headers["X-TAXII-Date-Added-First"] == "2026-01-01T00:00:04.000000Z"
+    assert r.headers["X-TAXII-Date-Added-Last"] == "2026-01-01T00:00:03.000000Z"
+    rest = api.get(f"{ROOT}/manifest", params={"limit": 10, "next": body["next"]}).json()
+    assert [e["id"] for e in rest["objects"]] == [ids[2], ids[1], ids[0]] and not rest["more"]
+
+    picked = api.get(f"{ROOT}/manifest", params={"match[id]": f"{ids[1]},{ids[3]}",
+                                                 "match[version]": "2026-01-01T00:00:01.000Z"}).json()
+    assert [e["id"] for e in picked["objects"]] == [ids[1]]
+    assert api.get(f"{ROOT}/manifest", params={"match[version]": "last"}).json()["objects"][0]["id"] == ids[4]
+    assert api.get(f"{ROOT}/manifest", params={"match[type]": "malware"}).json()["objects"] == []
+    assert api.get(f"{ROOT}/manifest", params={"match[version]": "latest"}).status_code == 400
+    assert api.get("/taxii2/root/collections/other/manifest").status_code == 404
+
+def test_manifest_revalidates_with_304(api, snapshot):
+    snapshot(0, count=3)
+    first = api.get(f"{ROOT}/manifest")
+    etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+    assert api.get(f"{ROOT}/manifest", headers={"If-None-Match": etag}).status_code == 304
+    assert api.get(f"{ROOT}/manifest", headers={"If-Modified-Since": last_modified}).status_code == 304
+    # another query is another representation
+    assert api.get(f"{ROOT}/manifest", params={"limit": 1}, headers={"If-None-Match": etag}).status_code == 200
+    snapshot(1, count=1)
+    fresh = api.get(f"{ROOT}/manifest", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["ETag"] != etag and len(fresh.json()["objects"]) == 4
+
+def test_object_and_versions(api, snapshot):
+    _, ids = snapshot(0, count=3)
+    r = api.get(f"{ROOT}/objects/{ids[1]}")
+    assert r.status_code == 200 and [o["id"] for o in r.json()["objects"]] == [ids[1]] and not r.json()["more"]
+    assert api.get(f"{ROOT}/objects/{ids[1]}", params={"match[version]": "2026-01-01T00:00:01.000Z"}).status_code == 200
+    assert api.get(f"{ROOT}/objects/{ids[1]}", params={"match[version]": "2026-01-01T00:00:02.000Z"}).status_code == 404
+    assert api.get(f"{ROOT}/objects/{ids[1]}", params={"match[version]": "yesterday"}).status_code == 400
+    assert api.get(f"{ROOT}/objects/indicator--missing").status_code == 404
+
+    versions = api.get(f"{ROOT}/objects/{ids[1]}/versions")
+    assert versions.json() == {"more": False, "versions": ["2026-01-01T00:00:01.000000Z"]}
+    assert versions.headers["X-TAXII-Date-Added-First"] == "2026-01-01T00:00:01.000000Z"
+    # known object, but not added after that date: an empty list rather than a 404
+    later = api.get(f"{ROOT}/objects/{ids[1]}/versions", params={"added_after": "2026-01-02T00:00:00Z"})
+    assert later.status_code == 200 and later.json()["versions"] == []
+    assert api.get(f"{ROOT}/objects/indicator--missing/versions").status_code == 404
@@ -0,0 +1,42 @@
+import os, time
+import pytest
+from app.store import ObjectStore
+from app.watcher import DirectoryWatcher
+
+DEBOUNCE = 0.3
+
+def _until(check, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+    return time.monotonic()
+
+@pytest.mark.parametrize("poll", [True, False], ids=["poll", "inotify"])
+def test_watcher_ingests_settled_files_and_drops_removed_ones(tmp_path, snapshot, poll):
+    store = ObjectStore(str(tmp_path), refresh_interval=3600)
+    watcher = DirectoryWatcher(store, debounce=DEBOUNCE, poll_interval=0.05, rescan_interval=0.2, poll=poll)
+    watcher.start()
+    try:
+        _until(lambda: store.ready)
+        assert store.managed
+        written = time.monotonic()
+        path, ids = snapshot(0)
+        seen = _until(lambda: len(store) == 10)
+        assert seen - written >= DEBOUNCE
+
+        # a file still being written is left alone until it holds still for the debounce
+        for count in range(1, 6):
+            _, later = snapshot(1, count=count)
+            last = time.monotonic()
+            time.sleep(DEBOUNCE / 3)
+        seen = _until(lambda: len(store) == 15)
+        assert seen - last >= DEBOUNCE
+        assert store.page(size=1)[0][0]["id"] == later[4]
+
+        os.remove(path)
+        _until(lambda: len(store) == 5)
+        assert store.meta(ids[0]) is None
+    finally:
+        watcher.stop()
+    assert not store.managed
@@ -0,0 +1,44 @@
+from datetime import datetime
+from app.file_store import _parse_dt, is_ts, parse_ts, ts_key
+from app.store import ObjectStore
+
+def test_parse_ts_fast_path_matches_strptime():
+    for s, dt in (("2026-01-01T00:00:00Z", datetime(2026, 1, 1)),
+                  ("2026-03-04T05:06:07.1Z", datetime(2026, 3, 4, 5, 6, 7, 100000)),
+                  ("2026-03-04T05:06:07.123Z", datetime(2026, 3, 4, 5, 6, 7, 123000)),
+                  ("1999-12-31T23:59:59.999999Z", datetime(1999, 12, 31, 23, 59, 59, 999999)),
+                  ("2024-02-29T12:00:00Z", datetime(2024, 2, 29, 12))):
+        assert parse_ts(s) == ts_key(_parse_dt(s)) == ts_key(dt)
+
+def test_parse_ts_falls_back_to_the_epoch():
+    for s in ("", "yesterday", "2026-01-01", "2026-01-01T24:00:00Z", "2026-02-30T00:00:00Z", "2026-01-01T00:00:00.1234567Z"):
+        assert parse_ts(s) == 0 and not is_ts(s)
+    assert is_ts("1970-01-01T00:00:00Z") and is_ts("2026-01-01T00:00:00.5Z")
+
+def _malware(second):
+    ts = f"2026-01-01T00:00:{second:02d}.000Z"
+    return {"type": "malware", "spec_version": "2.1", "id": f"malware--{second:08d}-0000-4000-8000-000000000000",
+            "created": ts, "modified": ts}
+
+def test_window_bounds_are_bisected(tmp_path, snapshot):
+    store = ObjectStore(str(tmp_path), refresh_interval=3600)
+    # indicators at 00:00:00 .. 00:00:09, one malware at 00:00:05
+    path, ids = snapshot(0, extra=[_malware(5)])
+    store.ingest(path)
+    window = {"since": "2026-01-01T00:00:03Z", "until": "2026-01-01T00:00:07Z"}
+
+    # since is inclusive, until exclusive; newest first, ties by id
+    items, total, _ = store.page(**window)
+    assert [o["id"] for o in items] == [ids[6], ids[5], ids[10], ids[4], ids[3]] and total == 5
+    items, total, _ = store.page(types=["indicator"], **window)
+    assert [o["id"] for o in items] == [ids[6], ids[5], ids[4], ids[3]] and total == 4
+    items, total, nxt = store.page(types=["indicator"], size=2, **window)
+    assert [o["id"] for o in items] == [ids[6], ids[5]] and total == 4
+    items, _, _ = store.page(types=["indicator"], after=nxt[:2], **window)
+    assert [o["id"] for o in items] == [ids[4], ids[3]]
+
+    assert store.page(since="2026-01-01T00:00:03.000001Z", until="2026-01-01T00:00:04Z")[1] == 0
+    assert store.page(since="2026-01-01T00:00:08Z", until="2026-01-01T00:00:03Z")[1] == 0
+    assert store.page(types=["malware"], until="2026-01-01T00:00:05Z")[1] == 0
+    total, objects = store.scan(types=["malware", "indicator"], since="2026-01-01T00:00:09Z")
+    assert total == 1 and [o["id"] for o in objects] == [ids[9]]